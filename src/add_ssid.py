@@ -1,18 +1,17 @@
-import sqlite3
 from datetime import datetime
 from termcolor import colored
 from network import get_networks_with_mean_rss
-from config import DB_FILE_PATH, SCANS_TO_ADD_SSID
+from db import get_connection
+from config import SCANS_TO_ADD_SSID
 
 def check_ssid_in_db(bssid):
     """Check if SSID is in the database and return the SSID ID if found."""
-    conn = sqlite3.connect(DB_FILE_PATH)
+    conn = get_connection()
     cursor = conn.cursor()
 
     # Check if SSID exists in the database
     cursor.execute("SELECT id FROM ssids WHERE bssid = ?", (bssid,))
     existing_ssid = cursor.fetchone()
-    conn.close()
 
     if existing_ssid:
         return existing_ssid[0]  # Return existing ssid_id
@@ -21,33 +20,29 @@ def check_ssid_in_db(bssid):
 
 def update_count_for_existing_ssids_in_db(existing_ssids):
     """Update the count for existing SSIDs in the database."""
-    conn = sqlite3.connect(DB_FILE_PATH)
-    cursor = conn.cursor()
-
-    for id, count in existing_ssids:
-        cursor.execute("""
-            UPDATE ssids
-            SET appeared_count = appeared_count + ?
-            WHERE id = ?
-        """, (count, id))
+    conn = get_connection()
+    with conn:
+        cursor = conn.cursor()
 
-    conn.commit()
-    conn.close()
+        for id, count in existing_ssids:
+            cursor.execute("""
+                UPDATE ssids
+                SET appeared_count = appeared_count + ?
+                WHERE id = ?
+            """, (count, id))
 
 def store_ssids_in_db(ssid, bssid, count):
     """Store Wi-Fi signal data in the database."""
-    conn = sqlite3.connect(DB_FILE_PATH)
-    cursor = conn.cursor()
-
-    # Insert Wi-Fi signal record
-    date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    cursor.execute("""
-        INSERT INTO ssids (ssid, bssid, date, appeared_count)
-        VALUES (?, ?, ?, ?)
-    """, (ssid, bssid, date, count))
+    conn = get_connection()
+    with conn:
+        cursor = conn.cursor()
 
-    conn.commit()
-    conn.close()
+        # Insert Wi-Fi signal record
+        date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        cursor.execute("""
+            INSERT INTO ssids (ssid, bssid, date, appeared_count)
+            VALUES (?, ?, ?, ?)
+        """, (ssid, bssid, date, count))
 
 def parse_range(range_str, max_value):
     """Parse a range input like '2', '6', or '9-12' and return a list of integers."""
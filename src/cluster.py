@@ -0,0 +1,38 @@
+import numpy as np
+from scipy.cluster.vq import kmeans2
+from predict import get_fingerprints_from_db, structure_data, build_fingerprint_matrix
+from db import get_connection
+from model import migrate_database
+from config import CLUSTER_COUNT
+
+def cluster_radio_map(radio_map, cluster_count=CLUSTER_COUNT):
+    """Cluster the locations of the radio map by k-means on their RSS vectors."""
+    cluster_count = min(cluster_count, len(radio_map["location_id"]))
+    if cluster_count == 0:
+        return np.array([], dtype=int)
+    _, labels = kmeans2(radio_map["rss"], cluster_count, minit="++", seed=0)
+    return labels
+
+def store_clusters_to_db(location_ids, labels):
+    """Replace the cluster assignments in the `location_clusters` table."""
+    conn = get_connection()
+    migrate_database(conn)
+    with conn:
+        cursor = conn.cursor()
+
+        cursor.execute("DELETE FROM location_clusters;")
+        cursor.executemany("""
+            INSERT INTO location_clusters (location_id, cluster_id)
+            VALUES (?, ?)
+        """, zip(location_ids.tolist(), labels.tolist()))
+
+def cluster_locations(cluster_count=CLUSTER_COUNT):
+    """Cluster the filtered fingerprints and store the assignments in the `location_clusters` table."""
+    radio_map = build_fingerprint_matrix(structure_data(get_fingerprints_from_db(use_aggregation=True)))
+    labels = cluster_radio_map(radio_map, cluster_count)
+    store_clusters_to_db(radio_map["location_id"], labels)
+    return labels
+
+if __name__ == "__main__":
+    labels = cluster_locations()
+    print(f"{len(labels)} locations have been clustered into {len(np.unique(labels))} clusters and stored in the `location_clusters` table.")
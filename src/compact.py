@@ -0,0 +1,68 @@
+import os
+from itertools import groupby
+from operator import itemgetter
+from db import get_connection, PACKED_RSS_MISSING
+from config import DB_FILE_PATH, COMPACT_CHUNK_SCANS
+from model import migrate_database
+
+def pack_scan(signals):
+    """
+    Pack the (ssid_id, rss) signals of one scan, sorted by SSID, into one byte of -2 * RSS per SSID from the first one.
+    Returns (first_ssid_id, packed_rss), or None if an RSS is not a multiple of 0.5 dB in [-127, 0] or an SSID repeats.
+    """
+    first_ssid_id = signals[0][0]
+    packed_rss = bytearray([PACKED_RSS_MISSING]) * (signals[-1][0] - first_ssid_id + 1)
+    for ssid_id, rss in signals:
+        value = -2 * rss
+        if value != int(value) or not 0 <= value < PACKED_RSS_MISSING or packed_rss[ssid_id - first_ssid_id] != PACKED_RSS_MISSING:
+            return None
+        packed_rss[ssid_id - first_ssid_id] = int(value)
+    return first_ssid_id, bytes(packed_rss)
+
+def compact_scans(chunk_scans=COMPACT_CHUNK_SCANS):
+    """
+    Move the signals of every stored scan from `wifi_signals` into one row of `packed_scans`.
+    Scans that cannot be packed stay as they are. Returns the number of scans packed and left as they are.
+    """
+    conn = get_connection()
+    migrate_database(conn)
+    with conn:
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        cursor.execute("""
+            SELECT DISTINCT scan_id FROM wifi_signals
+            WHERE scan_id NOT IN (SELECT scan_id FROM packed_scans)
+            ORDER BY scan_id
+        """)
+        scan_ids = [row[0] for row in cursor.fetchall()]
+
+        packed_count = 0
+        skipped_count = 0
+        for start in range(0, len(scan_ids), chunk_scans):
+            chunk = scan_ids[start:start + chunk_scans]
+            cursor.execute("""
+                SELECT scan_id, ssid_id, rss FROM wifi_signals
+                WHERE scan_id BETWEEN ? AND ?
+                ORDER BY scan_id, ssid_id
+            """, (chunk[0], chunk[-1]))
+
+            packed_scans = []
+            for scan_id, rows in groupby(cursor.fetchall(), key=itemgetter(0)):
+                packed = pack_scan([(ssid_id, rss) for scan_id, ssid_id, rss in rows])
+                if packed is None:
+                    skipped_count += 1
+                else:
+                    packed_scans.append((scan_id, *packed))
+
+            cursor.executemany("INSERT INTO packed_scans (scan_id, first_ssid_id, rss) VALUES (?, ?, ?)", packed_scans)
+            cursor.executemany("DELETE FROM wifi_signals WHERE scan_id = ?", [(scan_id,) for scan_id, _, _ in packed_scans])
+            packed_count += len(packed_scans)
+
+    return packed_count, skipped_count
+
+if __name__ == "__main__":
+    size_before = os.path.getsize(DB_FILE_PATH)
+    packed_count, skipped_count = compact_scans()
+    get_connection().execute("VACUUM")  # Return the freed pages to the file system
+    print(f"{packed_count} scans have been packed, {skipped_count} left as they are.")
+    print(f"Database size: {size_before / 1e6:.1f} MB -> {os.path.getsize(DB_FILE_PATH) / 1e6:.1f} MB")
@@ -10,7 +10,29 @@ class FilterType(Enum):
     NONE = None
     MOVING_AVERAGE = "moving_average"
     EXPONENTIAL = "exponential"
-    KALMAN = "kalman" # Not implemented yet
+    KALMAN = "kalman"
+
+class FilterBackend(Enum):
+    PYTHON = "python" # One group at a time with `statistics`, the reference implementation
+    NUMPY = "numpy" # Blocks of groups at once with segmented array operations
+
+class IndexType(Enum):
+    NONE = None # Brute force over every location
+    KD_TREE = "kd_tree" # Per-floor KD-trees; distances over every BSSID of the map, unheard ones at -100
+
+class MatchingType(Enum):
+    KNN = "knn" # Weighted KNN on Euclidean RSS distance
+    GAUSSIAN = "gaussian" # Posterior from per-location RSS mean and variance
+
+class TrackingType(Enum):
+    NONE = None
+    KALMAN = "kalman" # Constant-velocity Kalman filter on predicted positions
+    PARTICLE = "particle" # Particle filter weighted by RSS likelihood against the radio map
+
+class ScanBackend(Enum):
+    PIWIFI = "piwifi" # Live scans of the first wireless interface
+    NETSH = "netsh" # Live scans from `netsh` on Windows
+    REPLAY = "replay" # Recorded scans from a database or log, see `replay.py`
 
 class AggregationType(Enum):
     MEAN = "mean"
@@ -20,23 +42,76 @@ class AggregationType(Enum):
 DB_FILE_NAME = Map.ROBOTICS.value + "_wifi.db"
 PROJECT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 DB_FILE_PATH = os.path.join(PROJECT_DIR, DB_FILE_NAME)
+SITE_DB_FILE_PATHS = {site: os.path.join(PROJECT_DIR, site.value + "_wifi.db") for site in Map} # Served together by `sites.py`
+SITE_MIN_MATCHED_BSSIDS = 2 # A scan is placed at a site only if it hears at least this many of its BSSIDs
+DB_BUSY_TIMEOUT = 5.0 # Seconds to wait for a lock held by another connection
+DB_CACHE_SIZE_KB = 16384
+DB_MMAP_SIZE = 256 * 1024 * 1024
+DB_STATEMENT_CACHE_SIZE = 256
 
 SCANS_TO_ADD_SSID = 10
+AGGREGATOR_SAMPLE_SIZE = 128 # RSS values a NetworkAggregator keeps per BSSID for medians; exact up to this many scans
 DELAY_BETWEEN_SCANS = 0.5
-SCANS_FOR_FINGERPRINT = 100
+SCAN_BACKEND = ScanBackend.PIWIFI
+REPLAY_SOURCE = DB_FILE_PATH # Database or `.jsonl` scan log replayed by ScanBackend.REPLAY
+REPLAY_SESSION_ID = None # Replay one scan session of the database instead of all of them
+REPLAY_SPEED = 1.0 # Multiple of the recorded pace; 0 replays as fast as scans are asked for
+REPLAY_LOOP = True # Start over after the last scan instead of returning no networks
+REPLAY_MAX_GAP = 2.0 # Longer gaps between recorded scans, as between sessions, are shortened to this (s)
+SCAN_QUEUE_SIZE = 16 # Scans a BackgroundScanner holds for a slow consumer before dropping the oldest
+SKIP_STALE_SCANS = True # Drop a scan that repeats the previous one exactly, the driver's cached result rather than a new scan
+ADAPTIVE_SCAN_INTERVAL = True # Poll slower while the driver returns cached results and faster while every scan is new
+SCAN_MIN_INTERVAL = 0.1
+SCAN_MAX_INTERVAL = 4.0
+SCANS_FOR_FINGERPRINT = 100 # Polls of a fingerprint session, at DELAY_BETWEEN_SCANS; repeated results are polled but not stored
+FINGERPRINT_EARLY_STOP = True # End a session once the RSS of every tracked SSID has settled
+MIN_SCANS_FOR_FINGERPRINT = 5 # New scans before a session may stop; as few as one poll in ten returns a new scan
+FINGERPRINT_CONFIDENCE_Z = 1.96 # 95% confidence intervals
+FINGERPRINT_CONFIDENCE_HALF_WIDTH = 2.0 # An SSID has settled when the interval of its aggregated RSS is within this (dB)
 RSS_FOR_UNREACHABLE = -95
+STORE_UNREACHABLE_SIGNALS = True # False stores detected signals only and marks the database sparse; readers fill in RSS_FOR_UNREACHABLE
 
 FILTER = FilterType.MOVING_AVERAGE
 MOVING_AVERAGE_WINDOW = 3
 EXP_FILTER_ALPHA = 0.2
+FILTER_MAX_MISSED_SCANS = 5 # Live filter state of a BSSID is dropped after this many scans without it
+KALMAN_PROCESS_NOISE = 0.5 # RSS drift variance per scan (dB^2)
+KALMAN_MEASUREMENT_NOISE = 9.0 # RSS measurement variance (dB^2)
 
 AGGREGATION = AggregationType.MEDIAN
 USE_AGGREGATION = True
 
 INTERPOLATION_METHOD = 'cubic'  # Options: 'linear', 'nearest', 'cubic'
 USE_INTERPOLATION = True # Used for plotting only
+
+USE_VIRTUAL_GRID = False # Match against the interpolated grid built by `grid.py`
+GRID_RESOLUTION = 0.25 # Spacing of the virtual reference grid
+VIRTUAL_GRID_FILE_PATH = os.path.join(PROJECT_DIR, Map.ROBOTICS.value + "_grid.npz")
+USE_RADIO_MAP_FILE = False # Memory-map the radio map built by `radio_map_file.py` instead of querying the database
+RADIO_MAP_FILE_PATH = os.path.join(PROJECT_DIR, Map.ROBOTICS.value + "_radio_map.bin")
 USE_FILTER = True
+INCREMENTAL_FILTER = True # filter_rss recomputes only locations with new sessions; run it with incremental=False after changing the filter settings
+FILTER_FETCH_SIZE = 10000 # Raw RSS rows read at a time by filter_rss
+FILTER_WRITE_BATCH_SIZE = 1000 # Filtered groups written at a time by filter_rss
+FILTER_BACKEND = FilterBackend.NUMPY
+FILTER_WORKERS = 1 # More than one spreads the blocks of the NumPy backend over a process pool
+COMPACT_CHUNK_SCANS = 1000 # Scans packed at a time by `compact.py`
 
 K = 3
+MATCHING = MatchingType.KNN
+MIN_RSS_VARIANCE = 4.0 # Stored variances are raised to at least this value (dB^2)
+DEFAULT_RSS_VARIANCE = 25.0 # Variance assumed where a location has no fingerprint for a BSSID (dB^2)
+PREDICT_BATCH_SIZE = 1024 # Scans per block in predict_many
+INDEX = IndexType.NONE
+INDEX_MIN_LOCATIONS = 100 # Floors with fewer locations are searched by brute force
+USE_CLUSTERING = False # Match only inside the nearest clusters from `cluster.py`
+CLUSTER_COUNT = 8
+CLUSTERS_TO_SEARCH = 2
+TRACKING = TrackingType.NONE
+POSITION_PROCESS_NOISE = 0.5 # Acceleration standard deviation of the tracked device (m/s^2)
+POSITION_MEASUREMENT_NOISE = 1.0 # Standard deviation of a single position estimate (m)
+PARTICLE_COUNT = 2000
+PARTICLE_MOTION_STD = 0.5 # Random-walk speed of the particles (m/s)
+PARTICLE_RSS_STD = 6.0 # RSS standard deviation used for the particle likelihood (dB)
 STRUCTURED_FINGERPRINTS_FILE = "structured_fingerprints.csv"
 PLOT_GRAPH_WHILE_SCANNING = True
\ No newline at end of file
@@ -0,0 +1,46 @@
+import sqlite3
+import threading
+from config import DB_FILE_PATH, DB_BUSY_TIMEOUT, DB_CACHE_SIZE_KB, DB_MMAP_SIZE, DB_STATEMENT_CACHE_SIZE
+
+thread_local = threading.local()
+PACKED_RSS_MISSING = 255  # Byte of an SSID without a signal in a scan packed by `compact.py`
+
+def rss_at(packed_rss, index):
+    """SQL function: the RSS at `index` of a scan packed as one byte of -2 * RSS per SSID, or NULL if there is none."""
+    if packed_rss is None or not 0 <= index < len(packed_rss):
+        return None
+    value = packed_rss[index]
+    if value == PACKED_RSS_MISSING:
+        return None
+    return -(value // 2) if value % 2 == 0 else -value / 2
+
+def connect(db_file_path=None, check_same_thread=True):
+    """Open a new connection in WAL mode with the configured pragmas."""
+    conn = sqlite3.connect(db_file_path or DB_FILE_PATH, timeout=DB_BUSY_TIMEOUT,
+                           cached_statements=DB_STATEMENT_CACHE_SIZE, check_same_thread=check_same_thread)
+    conn.execute("PRAGMA journal_mode = WAL")  # Readers no longer block on a writer
+    conn.execute("PRAGMA synchronous = NORMAL")  # Durable in WAL mode up to the last checkpoint
+    conn.execute(f"PRAGMA mmap_size = {int(DB_MMAP_SIZE)}")
+    conn.execute(f"PRAGMA cache_size = -{int(DB_CACHE_SIZE_KB)}")
+    conn.create_function("rss_at", 2, rss_at, deterministic=True)
+    return conn
+
+def get_connection(db_file_path=None):
+    """
+    Return the connection of the current thread to the database, opening it on first use.
+    The connection stays open and keeps its prepared statements, so callers must not close it.
+    """
+    db_file_path = db_file_path or DB_FILE_PATH
+    connections = getattr(thread_local, "connections", None)
+    if connections is None:
+        connections = thread_local.connections = {}
+    conn = connections.get(db_file_path)
+    if conn is None:
+        conn = connections[db_file_path] = connect(db_file_path)
+    return conn
+
+def close_connections():
+    """Close the connections of the current thread."""
+    for conn in getattr(thread_local, "connections", {}).values():
+        conn.close()
+    thread_local.connections = {}
@@ -1,7 +1,14 @@
-import sqlite3
 import numpy as np
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import groupby
+from operator import itemgetter
 from statistics import mean, median, mode
-from config import DB_FILE_PATH, FILTER, MOVING_AVERAGE_WINDOW, EXP_FILTER_ALPHA, AGGREGATION, USE_FILTER
+from db import get_connection
+from config import FILTER, FilterType, MOVING_AVERAGE_WINDOW, EXP_FILTER_ALPHA, AGGREGATION, USE_FILTER
+from config import KALMAN_PROCESS_NOISE, KALMAN_MEASUREMENT_NOISE, INCREMENTAL_FILTER, FILTER_FETCH_SIZE, FILTER_WRITE_BATCH_SIZE
+from config import FILTER_BACKEND, FilterBackend, FILTER_WORKERS
+from model import migrate_database, get_wifi_signals_source
 
 def apply_moving_average(data, window_size):
     return np.convolve(data, np.ones(window_size) / window_size, mode='valid')
@@ -12,6 +19,16 @@ def apply_exponential_filter(data, alpha):
         filtered_data.append(alpha * data[i] + (1 - alpha) * filtered_data[-1])
     return filtered_data
 
+def apply_kalman_filter(data, process_noise, measurement_noise):
+    filtered_data = [data[0]]
+    variance = measurement_noise
+    for i in range(1, len(data)):
+        variance += process_noise
+        gain = variance / (variance + measurement_noise)
+        filtered_data.append(filtered_data[-1] + gain * (data[i] - filtered_data[-1]))
+        variance *= 1 - gain
+    return filtered_data
+
 def aggregate_data(data, method):
     if method == "mean":
         return mean(data)
@@ -22,58 +39,227 @@ def aggregate_data(data, method):
     else:
         raise ValueError(f"Unknown aggregation method: {method}")
 
-def filter_rss():
-    """Filter RSS values from the database and store them in the `filtered_wifi_signals` table."""
-    conn = sqlite3.connect(DB_FILE_PATH)
-    cursor = conn.cursor()
-
-    # Erase all data from the `filtered_wifi_signals` table
-    cursor.execute("DELETE FROM filtered_wifi_signals;")
-
-    # Retrieve all RSS values from the `wifi_signals` table
-    cursor.execute("""
-        SELECT w.scan_id, w.ssid_id, w.rss, sc.session_id, ss.location_id
-        FROM wifi_signals w
-        JOIN scans sc ON w.scan_id = sc.id
-        JOIN scan_sessions ss ON sc.session_id = ss.id
-    """)
-    wifi_signals = cursor.fetchall()
-
-    # Aggregate RSS values by location_id and ssid_id
-    rss_data = {}
-    for scan_id, ssid_id, rss, session_id, location_id in wifi_signals:
-        key = (location_id, ssid_id)
-        if key not in rss_data:
-            rss_data[key] = []
-        rss_data[key].append(rss)
-
-    # Apply filter and aggregate
-    filtered_aggregated_data = []
-    for (location_id, ssid_id), rss_values in rss_data.items():
-        if USE_FILTER:
-            if FILTER == "moving_average":
-                filtered_rss = apply_moving_average(rss_values, MOVING_AVERAGE_WINDOW)
-            elif FILTER == "exponential":
-                filtered_rss = apply_exponential_filter(rss_values, EXP_FILTER_ALPHA)
-            else:
-                filtered_rss = rss_values
+def filter_and_aggregate(rss_values):
+    """Filter the RSS values of one (location, SSID) group and return its aggregate, sample count and variance."""
+    if USE_FILTER:
+        if FILTER == FilterType.MOVING_AVERAGE:
+            filtered_rss = apply_moving_average(rss_values, MOVING_AVERAGE_WINDOW)
+        elif FILTER == FilterType.EXPONENTIAL:
+            filtered_rss = apply_exponential_filter(rss_values, EXP_FILTER_ALPHA)
+        elif FILTER == FilterType.KALMAN:
+            filtered_rss = apply_kalman_filter(rss_values, KALMAN_PROCESS_NOISE, KALMAN_MEASUREMENT_NOISE)
         else:
             filtered_rss = rss_values
+    else:
+        filtered_rss = rss_values
 
-        aggregated_rss = aggregate_data(filtered_rss, AGGREGATION.value)
-        sample_num = len(filtered_rss)
-        var_rss = np.var(filtered_rss) if sample_num > 1 else 0
+    aggregated_rss = aggregate_data(filtered_rss, AGGREGATION.value)
+    sample_num = len(filtered_rss)
+    var_rss = np.var(filtered_rss) if sample_num > 1 else 0
+    return aggregated_rss, sample_num, var_rss
 
-        filtered_aggregated_data.append((location_id, ssid_id, aggregated_rss, sample_num, var_rss))
+def fetch_in_chunks(cursor, chunk_size):
+    """Yield the rows of a cursor, holding at most `chunk_size` of them in memory."""
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            return
+        yield from rows
 
-    # Insert aggregated data into the `filtered_wifi_signals` table
+def upsert_filtered_signals(cursor, filtered_aggregated_data):
+    """Insert or replace rows of the `filtered_wifi_signals` table, one per (location_id, ssid_id)."""
     cursor.executemany("""
         INSERT INTO filtered_wifi_signals (location_id, ssid_id, agg_rss, sample_num, variance)
         VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (location_id, ssid_id) DO UPDATE
+        SET agg_rss = excluded.agg_rss, sample_num = excluded.sample_num, variance = excluded.variance
     """, filtered_aggregated_data)
 
-    conn.commit()
-    conn.close()
+def pad_groups(values, starts, counts):
+    """Lay the values of consecutive groups out as the rows of a NaN-padded matrix."""
+    matrix = np.full((len(starts), counts.max()), np.nan)
+    rows = np.repeat(np.arange(len(starts)), counts)
+    matrix[rows, np.arange(len(values)) - np.repeat(starts, counts)] = values
+    return matrix
+
+def apply_moving_average_many(matrix, counts, window_size):
+    """`apply_moving_average` on every row of a padded matrix; returns the filtered matrix and sample counts."""
+    width = max(matrix.shape[1] - window_size + 1, window_size)
+    filtered = np.full((len(matrix), width), np.nan)
+    valid_width = matrix.shape[1] - window_size + 1
+    if valid_width > 0:
+        # Same products and order of summation as `np.convolve`, so equal windows give bitwise equal results
+        filtered[:, :valid_width] = sum(matrix[:, j:j + valid_width] * (1 / window_size) for j in range(window_size))
+
+    # Like `np.convolve`, a group shorter than the window gives window - count + 1 copies of sum / window
+    short = np.flatnonzero(counts < window_size)
+    for row in short.tolist():
+        filtered[row, :window_size - counts[row] + 1] = np.nansum(matrix[row] * (1 / window_size))
+    filtered_counts = np.where(counts < window_size, window_size - counts, counts - window_size) + 1
+    return filtered, filtered_counts
+
+def apply_exponential_filter_many(matrix, alpha):
+    """`apply_exponential_filter` along every row of a padded matrix at once, one column per step."""
+    filtered = np.empty_like(matrix)
+    filtered[:, 0] = matrix[:, 0]
+    for p in range(1, matrix.shape[1]):
+        filtered[:, p] = alpha * matrix[:, p] + (1 - alpha) * filtered[:, p - 1]
+    return filtered
+
+def apply_kalman_filter_many(matrix, process_noise, measurement_noise):
+    """`apply_kalman_filter` along every row of a padded matrix at once; the gains depend only on the column."""
+    filtered = np.empty_like(matrix)
+    filtered[:, 0] = matrix[:, 0]
+    variance = measurement_noise
+    for p in range(1, matrix.shape[1]):
+        variance += process_noise
+        gain = variance / (variance + measurement_noise)
+        filtered[:, p] = filtered[:, p - 1] + gain * (matrix[:, p] - filtered[:, p - 1])
+        variance *= 1 - gain
+    return filtered
+
+def mode_many(filtered):
+    """`statistics.mode` of every row of a padded matrix: the most common value, the first one seen on ties."""
+    order = np.argsort(filtered, axis=1, kind="stable")  # Equal values keep their order; the NaN padding sorts last
+    values = np.take_along_axis(filtered, order, axis=1)
+    run_starts = np.ones(values.shape, dtype=bool)
+    run_starts[:, 1:] = values[:, 1:] != values[:, :-1]
+
+    # Length of the run of equal values every element belongs to
+    width = values.shape[1]
+    run_ids = np.cumsum(run_starts, axis=1) - 1 + np.arange(len(values))[:, None] * width
+    run_counts = np.bincount(run_ids.ravel(), minlength=values.size)[run_ids]
+
+    # The longest run wins, then the one whose value was seen first
+    score = np.where(run_starts & ~np.isnan(values), run_counts * (width + 1) - order, -1)
+    return values[np.arange(len(values)), np.argmax(score, axis=1)]
+
+def aggregate_block(block, filter_type, window_size, alpha, process_noise, measurement_noise, method):
+    """
+    Filter and aggregate every (location_id, ssid_id) group of a block of (location_id, ssid_id, rss, scan_id) rows
+    that holds whole groups. Returns the rows for `filtered_wifi_signals`, matching `filter_and_aggregate` on each group.
+    """
+    block = block[np.lexsort((block[:, 3], block[:, 1], block[:, 0]))]  # By group, then in scan order
+    keys = block[:, :2]
+    starts = np.flatnonzero(np.r_[True, np.any(keys[1:] != keys[:-1], axis=1)])
+    counts = np.diff(np.r_[starts, len(block)])
+    matrix = pad_groups(block[:, 2], starts, counts)
+
+    if filter_type == FilterType.MOVING_AVERAGE:
+        filtered, counts = apply_moving_average_many(matrix, counts, window_size)
+    elif filter_type == FilterType.EXPONENTIAL:
+        filtered = apply_exponential_filter_many(matrix, alpha)
+    elif filter_type == FilterType.KALMAN:
+        filtered = apply_kalman_filter_many(matrix, process_noise, measurement_noise)
+    else:
+        filtered = matrix
+
+    if method == "mean":
+        aggregated = np.nanmean(filtered, axis=1)
+    elif method == "median":
+        aggregated = np.nanmedian(filtered, axis=1)
+    elif method == "mode":
+        aggregated = mode_many(filtered)
+    else:
+        raise ValueError(f"Unknown aggregation method: {method}")
+    variances = np.where(counts > 1, np.nanvar(filtered, axis=1), 0)
+
+    location_ids, ssid_ids = keys[starts].astype(int).T
+    return list(zip(location_ids.tolist(), ssid_ids.tolist(), aggregated.tolist(), counts.tolist(), variances.tolist()))
+
+def iterate_blocks(cursor, chunk_size):
+    """
+    Yield the rows of a cursor sorted by group as arrays of about `chunk_size` rows, never splitting a
+    (location_id, ssid_id) group, so memory is bounded by the largest group rather than the largest location.
+    """
+    carry = np.empty((0, 4))
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        block = np.concatenate([carry, np.array(rows, dtype=float)])
+        last_start = np.flatnonzero(np.any(block[:, :2] != block[-1, :2], axis=1))
+        last_start = last_start[-1] + 1 if len(last_start) else 0
+        carry = block[last_start:]
+        if last_start:
+            yield block[:last_start]
+    if len(carry):
+        yield carry
+
+def iterate_filtered_groups(wifi_signals, backend, workers):
+    """Yield a `filtered_wifi_signals` row for every group of the signals, computed by the given backend."""
+    if backend == FilterBackend.PYTHON:
+        for (location_id, ssid_id), rows in groupby(fetch_in_chunks(wifi_signals, FILTER_FETCH_SIZE), key=itemgetter(0, 1)):
+            rss_values = [rss for location_id, ssid_id, rss, scan_id in rows]
+            yield (location_id, ssid_id, *filter_and_aggregate(rss_values))
+        return
+
+    settings = (FILTER if USE_FILTER else FilterType.NONE, MOVING_AVERAGE_WINDOW, EXP_FILTER_ALPHA,
+                KALMAN_PROCESS_NOISE, KALMAN_MEASUREMENT_NOISE, AGGREGATION.value)
+    if workers <= 1:
+        for block in iterate_blocks(wifi_signals, FILTER_FETCH_SIZE):
+            yield from aggregate_block(block, *settings)
+        return
+
+    # Keep a few blocks in flight per worker, so memory stays bounded however many blocks there are
+    with ProcessPoolExecutor(workers) as executor:
+        pending = deque()
+        for block in iterate_blocks(wifi_signals, FILTER_FETCH_SIZE):
+            pending.append(executor.submit(aggregate_block, block, *settings))
+            if len(pending) >= 2 * workers:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+def filter_rss(incremental=INCREMENTAL_FILTER, backend=FILTER_BACKEND, workers=FILTER_WORKERS):
+    """
+    Filter RSS values from the database and store them in the `filtered_wifi_signals` table.
+    With `incremental` only the groups of locations with sessions missing from `processed_sessions` are
+    recomputed and upserted; otherwise every group is rebuilt. Returns the number of groups written.
+    `backend` chooses how the groups are computed and `workers` how many processes the NumPy backend uses.
+    """
+    conn = get_connection()
+    migrate_database(conn)
+    with conn:
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")  # No session may be stored between reading and marking it processed
+
+        if not incremental:
+            # Erase all data from the `filtered_wifi_signals` table and start over
+            cursor.execute("DELETE FROM filtered_wifi_signals")
+            cursor.execute("DELETE FROM processed_sessions")
+
+        # Stream the RSS values of the locations with unprocessed sessions, grouped and in scan order
+        wifi_signals = conn.execute(f"""
+            SELECT ss.location_id, w.ssid_id, w.rss, w.scan_id
+            FROM {get_wifi_signals_source(conn)} w
+            JOIN scans sc ON w.scan_id = sc.id
+            JOIN scan_sessions ss ON sc.session_id = ss.id
+            WHERE ss.location_id IN (
+                SELECT location_id FROM scan_sessions
+                WHERE id NOT IN (SELECT session_id FROM processed_sessions)
+            )
+            ORDER BY ss.location_id, w.ssid_id, w.scan_id
+        """)
+
+        # Filter and aggregate each (location_id, ssid_id) group as soon as it is complete
+        filtered_aggregated_data = []
+        group_count = 0
+        for row in iterate_filtered_groups(wifi_signals, backend, workers):
+            filtered_aggregated_data.append(row)
+            group_count += 1
+            if len(filtered_aggregated_data) >= FILTER_WRITE_BATCH_SIZE:
+                upsert_filtered_signals(cursor, filtered_aggregated_data)
+                filtered_aggregated_data = []
+        upsert_filtered_signals(cursor, filtered_aggregated_data)
+
+        cursor.execute("""
+            INSERT INTO processed_sessions (session_id)
+            SELECT id FROM scan_sessions
+            WHERE id NOT IN (SELECT session_id FROM processed_sessions)
+        """)
+
+    return group_count
 
 if __name__ == "__main__":
     filter_rss()
@@ -1,103 +1,119 @@
-import sqlite3
-from time import sleep
+import time
 from datetime import datetime
 from termcolor import colored
 
-from network import get_networks
-from config import DB_FILE_PATH, SCANS_FOR_FINGERPRINT, RSS_FOR_UNREACHABLE, DELAY_BETWEEN_SCANS
-
-def store_session_to_db(location_id, session, session_time):
-    """Store multiple passes of scan data of WiFi signals into the database."""
-    conn = sqlite3.connect(DB_FILE_PATH)
-    cursor = conn.cursor()
-
-    # Insert scan pass record
-    cursor.execute("""
-        INSERT INTO scan_sessions (location_id, session_time)
-        VALUES (?, ?)
-    """, (location_id, session_time))
-    session_id = cursor.lastrowid
-
-    # Get all SSIDs from the database
-    cursor.execute("SELECT id, ssid, bssid FROM ssids")
-    all_ssids = cursor.fetchall()
-    detected_wifi_signals_stored_count = 0
-    unreachable_wifi_signals_stored_count = 0
-
-    for networks, scan_time in session:
-        # Insert scan record
+from network import BackgroundScanner, NetworkAggregator, is_stale_scan, scan_fingerprint
+from db import get_connection
+from model import migrate_database, mark_sparse_signals
+from config import SCANS_FOR_FINGERPRINT, RSS_FOR_UNREACHABLE, STORE_UNREACHABLE_SIGNALS, FINGERPRINT_EARLY_STOP, MIN_SCANS_FOR_FINGERPRINT
+
+def store_session_to_db(location_id, session, session_time, store_unreachable=STORE_UNREACHABLE_SIGNALS):
+    """
+    Store multiple passes of scan data of WiFi signals into the database in one transaction.
+    Without `store_unreachable` only detected signals are stored, and the database is marked sparse so that
+    readers imply RSS_FOR_UNREACHABLE for the other SSIDs known at the time.
+    """
+    conn = get_connection()
+    migrate_database(conn)
+    with conn:
+        cursor = conn.cursor()
+        cursor.execute("BEGIN")
+        if not store_unreachable:
+            mark_sparse_signals(cursor)
+
+        # Get all SSIDs from the database once
+        cursor.execute("SELECT id, bssid FROM ssids")
+        ssid_ids = {bssid: ssid_id for ssid_id, bssid in cursor.fetchall()}
+        all_ssid_ids = list(ssid_ids.values())
+
+        # Insert scan pass record, with the last SSID the session stores signals for
         cursor.execute("""
+            INSERT INTO scan_sessions (location_id, session_time, last_ssid_id)
+            VALUES (?, ?, ?)
+        """, (location_id, session_time, max(all_ssid_ids, default=None)))
+        session_id = cursor.lastrowid
+
+        # Insert scan records; their IDs are assigned in insertion order
+        cursor.executemany("""
             INSERT INTO scans (session_id, scan_time)
             VALUES (?, ?)
-        """, (session_id, scan_time))
-        scan_id = cursor.lastrowid
+        """, [(session_id, scan_time) for networks, scan_time in session])
+        cursor.execute("SELECT id FROM scans WHERE session_id = ? ORDER BY id", (session_id,))
+        scan_ids = [row[0] for row in cursor.fetchall()]
 
-        detected_ssids = set()
+        wifi_signals = []
+        detected_wifi_signals_stored_count = 0
+        unreachable_wifi_signals_stored_count = 0
 
-        for network in networks:
-            ssid = network["ssid"]
-            bssid = network["bssid"]
-            rss = network["rss"]
-            # Check if SSID already exists in the database
-            cursor.execute("SELECT id FROM ssids WHERE bssid = ?", (bssid,))
-            existing_ssid = cursor.fetchone()
+        for scan_id, (networks, scan_time) in zip(scan_ids, session):
+            detected_ssids = set()
 
-            if existing_ssid:
-                ssid_id = existing_ssid[0]  # Use existing SSID ID
+            for network in networks:
+                ssid_id = ssid_ids.get(network["bssid"])
+                if ssid_id is None:
+                    continue  # Skip to store scan for SSID if it's not in the database
                 detected_ssids.add(ssid_id)
-                # print(colored(f'ID: {ssid_id}, SSID: {ssid}, BSSID: {bssid}, RSSI: {rss}', "light_green"))
-            else:
-                # print(colored(f'SSID: {ssid}, BSSID: {bssid}, RSSI: {rss}', "light_yellow"))
-                continue  # Skip to store scan for SSID if it's not in the database
-
-            # Insert Wi-Fi signal record
-            cursor.execute("""
-                INSERT INTO wifi_signals (scan_id, ssid_id, rss)
-                VALUES (?, ?, ?)
-            """, (scan_id, ssid_id, rss))
-            detected_wifi_signals_stored_count += 1
-
-        # Assign RSS_FOR_UNREACHABLE to SSIDs not detected in this scan
-        for ssid_id, ssid, bssid in all_ssids:
-            if ssid_id not in detected_ssids:
-                cursor.execute("""
-                    INSERT INTO wifi_signals (scan_id, ssid_id, rss)
-                    VALUES (?, ?, ?)
-                """, (scan_id, ssid_id, RSS_FOR_UNREACHABLE))
-                unreachable_wifi_signals_stored_count += 1
-                # print(colored(f'ID: {ssid_id}, SSID: {ssid}, BSSID: {bssid}, RSSI: {RSS_FOR_UNREACHABLE}', "light_red"))
-
-    print(f"Detected: {detected_wifi_signals_stored_count}")
-    print(f"Unreachable: {unreachable_wifi_signals_stored_count}")
-    print(f"Total Fingerprints Stored: {detected_wifi_signals_stored_count + unreachable_wifi_signals_stored_count}")
-
-    conn.commit()
-    conn.close()
+                wifi_signals.append((scan_id, ssid_id, network["rss"]))
+                detected_wifi_signals_stored_count += 1
+
+            if not store_unreachable:
+                continue
+
+            # Assign RSS_FOR_UNREACHABLE to SSIDs not detected in this scan
+            for ssid_id in all_ssid_ids:
+                if ssid_id not in detected_ssids:
+                    wifi_signals.append((scan_id, ssid_id, RSS_FOR_UNREACHABLE))
+                    unreachable_wifi_signals_stored_count += 1
+
+        # Insert Wi-Fi signal records
+        cursor.executemany("""
+            INSERT INTO wifi_signals (scan_id, ssid_id, rss)
+            VALUES (?, ?, ?)
+        """, wifi_signals)
+
+        print(f"Detected: {detected_wifi_signals_stored_count}")
+        print(f"Unreachable: {unreachable_wifi_signals_stored_count}")
+        print(f"Total Fingerprints Stored: {detected_wifi_signals_stored_count + unreachable_wifi_signals_stored_count}")
 
 
 def get_location_from_db(location_id):
     """Check if location ID exists in the database."""
-    conn = sqlite3.connect(DB_FILE_PATH)
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute("SELECT * FROM locations WHERE id = ?", (location_id,))
     location = cursor.fetchone()
-    conn.close()
     return location
 
 def get_all_locations_from_db():
-    conn = sqlite3.connect(DB_FILE_PATH)
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute("SELECT * FROM locations")
     locations = cursor.fetchall()
-    conn.close()
     return locations
 
+def get_scan_counts_from_db():
+    """Return {location_id: scans} over all the sessions of every fingerprinted location."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT ss.location_id, COUNT(*)
+        FROM scans sc
+        JOIN scan_sessions ss ON sc.session_id = ss.id
+        GROUP BY ss.location_id
+    """)
+    return dict(cursor.fetchall())
+
+def get_tracked_bssids_from_db():
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT bssid FROM ssids")
+    return {row[0] for row in cursor.fetchall()}
+
 def get_ssid_id_from_db(ssid, bssid):
-    conn = sqlite3.connect(DB_FILE_PATH)
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute("SELECT id FROM ssids WHERE ssid = ? AND bssid = ?", (ssid, bssid))
     selected_ssid = cursor.fetchone()
-    conn.close()
     if selected_ssid:
         return selected_ssid[0]
     else:
@@ -113,11 +129,12 @@ if __name__ == "__main__":
 
         if location_id == "0":
             locations = get_all_locations_from_db()
+            scan_counts = get_scan_counts_from_db()
             if locations:
                 print("\nExisting Locations:")
-                print("ID | X | Y | Floor | Location Name")
+                print("ID | X | Y | Floor | Location Name | Scans")
                 for loc in locations:
-                    print(f"{loc[0]} | {loc[1]} | {loc[2]} | {loc[3]} | {loc[4]}")
+                    print(f"{loc[0]} | {loc[1]} | {loc[2]} | {loc[3]} | {loc[4]} | {scan_counts.get(loc[0], 0)}")
             else:
                 print("\nNo locations found.")
             location_id = input("\nEnter location ID: ").strip()
@@ -141,27 +158,54 @@ if __name__ == "__main__":
     session_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     print(f"{colored('Do not Move! Fingerprinting...', 'yellow')}")
 
+    # Poll at a fixed interval, so a session of SCANS_FOR_FINGERPRINT polls takes as long as it always has, and keep
+    # every poll: the scanner waits instead of dropping one if the progress bar falls behind. Repeats of the
+    # driver's cached result are shown on the bar but not stored as more samples.
+    scanner = BackgroundScanner(drop_oldest=False, skip_stale=False, adaptive=False).start()
+    # Tracked SSIDs are stored with RSS_FOR_UNREACHABLE in the scans that miss them, so they settle that way too
+    tracked_bssids = get_tracked_bssids_from_db()
+    aggregator = NetworkAggregator(missing_rss=RSS_FOR_UNREACHABLE)
+    last_fingerprint = None
+    stale_count = 0
+    start_time = time.monotonic()
     try:
         for i in range(SCANS_FOR_FINGERPRINT):
-            # Scan for Wi-Fi networks
-            scan_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            networks = get_networks()
-            if networks:
+            # Wait for the next Wi-Fi scan
+            timestamp, networks = scanner.get()
+            scan_time = datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S")
+            stale = is_stale_scan(networks, last_fingerprint)
+            last_fingerprint = scan_fingerprint(networks)
+            if stale:
+                stale_count += 1
+            elif networks:
                 session.append([networks, scan_time])
+                aggregator.add([network for network in networks if network["bssid"] in tracked_bssids])
 
             # Display loading bar
             progress = (i + 1) / SCANS_FOR_FINGERPRINT * 100
             bar_length = 50
             block = int(bar_length * progress / 100)
-            hash_color = "green" if networks else "red"
+            hash_color = "yellow" if stale else "green" if networks else "red"
             text = f"\r[{colored('#', hash_color) * block + '-' * (bar_length - block)}] {i + 1}/{SCANS_FOR_FINGERPRINT}"
             print(text, end='', flush=True)
-            sleep(DELAY_BETWEEN_SCANS)
+
+            if FINGERPRINT_EARLY_STOP and len(session) >= MIN_SCANS_FOR_FINGERPRINT and not aggregator.get_unsettled_bssids():
+                break
         print()
+        unsettled_bssids = aggregator.get_unsettled_bssids()
+        elapsed = time.monotonic() - start_time
+        if unsettled_bssids:
+            print(f"{len(session)} scans taken in {elapsed:.0f} s, {len(unsettled_bssids)} of {len(aggregator.networks)} SSIDs still unsettled: {', '.join(unsettled_bssids)}")
+        else:
+            print(f"All {len(aggregator.networks)} SSIDs settled after {len(session)} scans in {elapsed:.0f} s.")
+        if stale_count:
+            print(f"Skipped {stale_count} repeated {'scan' if stale_count == 1 else 'scans'}.")
 
     except KeyboardInterrupt:
         print("\nCancelled.")
         exit()
+    finally:
+        scanner.stop()
 
     if session:
         store_session_to_db(location_id, session, session_time)
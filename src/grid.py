@@ -0,0 +1,59 @@
+import numpy as np
+from scipy.interpolate import griddata
+from scipy.spatial import QhullError
+from predict import get_fingerprints_from_db, structure_data, build_fingerprint_matrix
+from config import GRID_RESOLUTION, INTERPOLATION_METHOD, VIRTUAL_GRID_FILE_PATH
+
+VIRTUAL_LOCATION_ID = -1  # Location ID of every virtual grid point
+
+def interpolate_floor(points, rss, grid_points, method):
+    """
+    Interpolate the RSS of every BSSID onto the grid points, filling points outside the survey area from the nearest location.
+    Each BSSID is clipped to the range it was surveyed in, since cubic interpolation overshoots between locations.
+    """
+    nearest = griddata(points, rss, grid_points, method="nearest")
+    if method == "nearest":
+        return nearest
+    try:
+        interpolated = griddata(points, rss, grid_points, method=method)
+    except QhullError:
+        return nearest  # Too few or collinear locations to triangulate
+    return np.clip(np.where(np.isnan(interpolated), nearest, interpolated), rss.min(axis=0), rss.max(axis=0))
+
+def build_virtual_grid(radio_map, resolution=GRID_RESOLUTION, method=INTERPOLATION_METHOD):
+    """Interpolate the radio map onto a regular grid per floor and return it as a radio map of virtual locations."""
+    rss, x, y, floors = [], [], [], []
+    for floor in np.unique(radio_map["floor"]).tolist():
+        rows = radio_map["floor"] == floor
+        points = np.column_stack([radio_map["x"][rows], radio_map["y"][rows]])
+        xi = np.arange(points[:, 0].min(), points[:, 0].max() + resolution / 2, resolution)
+        yi = np.arange(points[:, 1].min(), points[:, 1].max() + resolution / 2, resolution)
+        xi, yi = np.meshgrid(xi, yi)
+        grid_points = np.column_stack([xi.ravel(), yi.ravel()])
+
+        rss.append(interpolate_floor(points, radio_map["rss"][rows], grid_points, method))
+        x.append(grid_points[:, 0])
+        y.append(grid_points[:, 1])
+        floors.append(np.full(len(grid_points), floor))
+
+    bssid_count = len(radio_map["bssid_index"])
+    return {
+        "bssid_index": dict(radio_map["bssid_index"]),
+        "rss": np.concatenate(rss).astype(np.float32) if rss else np.empty((0, bssid_count), dtype=np.float32),
+        "location_id": np.full(sum(len(v) for v in x), VIRTUAL_LOCATION_ID),
+        "x": np.concatenate(x) if x else np.empty(0),
+        "y": np.concatenate(y) if y else np.empty(0),
+        "floor": np.concatenate(floors).astype(int) if floors else np.empty(0, dtype=int),
+    }
+
+def save_virtual_grid(grid_map, filename=VIRTUAL_GRID_FILE_PATH):
+    """Save the virtual radio map to a compressed NumPy archive."""
+    bssids = sorted(grid_map["bssid_index"], key=grid_map["bssid_index"].get)
+    np.savez_compressed(filename, bssids=np.array(bssids, dtype=str), rss=grid_map["rss"], location_id=grid_map["location_id"],
+                        x=grid_map["x"], y=grid_map["y"], floor=grid_map["floor"])
+
+if __name__ == "__main__":
+    radio_map = build_fingerprint_matrix(structure_data(get_fingerprints_from_db(use_aggregation=True)))
+    grid_map = build_virtual_grid(radio_map)
+    save_virtual_grid(grid_map)
+    print(f"{len(grid_map['x'])} virtual locations from {len(radio_map['x'])} locations have been stored in {VIRTUAL_GRID_FILE_PATH}.")
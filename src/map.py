@@ -4,7 +4,7 @@ import matplotlib.pyplot as plt
 from mpl_toolkits.mplot3d.art3d import Poly3DCollection
 from matplotlib.widgets import Button
 from matplotlib.animation import FuncAnimation
-from predict import init_prediction, predict_location
+from predict import RadioMapReloader, predict_location
 from config import FILTER, K, USE_AGGREGATION
 
 def get_test_position():
@@ -162,10 +162,11 @@ btn_roll_p.on_clicked(inx_roll)
 btn_roll_m.on_clicked(dcx_roll)
 btn_axes.on_clicked(toggle_axes)
 
-structured_fingerprints =  init_prediction()
+reloader = RadioMapReloader()
 
 def update(frame):
-    # x, y, floor = predict_location(structured_fingerprints, filter_type=FILTER, k=K, use_aggregation=USE_AGGREGATION)
+    # reloader.refresh()
+    # x, y, floor = predict_location(reloader.radio_map, filter_type=FILTER, k=K, use_aggregation=USE_AGGREGATION)
     x, y, floor = get_test_position()
     location_point.set_data_3d([get_map_x(x)], [get_map_y(y)], [get_map_z(floor)])
     text_label.set_text(f"({x:.2f}, {y:.2f}, {floor:.2f})")
@@ -1,9 +1,80 @@
-import sqlite3
-from config import DB_FILE_PATH
+from db import get_connection
+from config import RSS_FOR_UNREACHABLE
 
-def initialize_database():
-    """Initialize the database with the required tables."""
-    conn = sqlite3.connect(DB_FILE_PATH)
+# Each migration upgrades the database by one `user_version`; append new ones, never edit applied ones.
+MIGRATIONS = [
+    # 1: Indexes for the joins of `filter_rss`, `plot_by_time` and `predict`
+    [
+        "CREATE INDEX IF NOT EXISTS idx_wifi_signals_scan_ssid ON wifi_signals (scan_id, ssid_id, rss)",
+        "CREATE INDEX IF NOT EXISTS idx_wifi_signals_ssid ON wifi_signals (ssid_id)",
+        "CREATE INDEX IF NOT EXISTS idx_scans_session ON scans (session_id, scan_time)",
+        "CREATE INDEX IF NOT EXISTS idx_scan_sessions_location ON scan_sessions (location_id)",
+        "CREATE INDEX IF NOT EXISTS idx_filtered_wifi_signals_location_ssid ON filtered_wifi_signals (location_id, ssid_id)",
+    ],
+    # 2: Sessions already aggregated by an incremental `filter_rss`, and one filtered row per (location, SSID) to upsert
+    [
+        """
+        CREATE TABLE IF NOT EXISTS processed_sessions (
+            session_id INTEGER PRIMARY KEY,
+            processed_time DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (session_id) REFERENCES scan_sessions (id)
+        )
+        """,
+        "DELETE FROM filtered_wifi_signals WHERE id NOT IN (SELECT MAX(id) FROM filtered_wifi_signals GROUP BY location_id, ssid_id)",
+        "DROP INDEX IF EXISTS idx_filtered_wifi_signals_location_ssid",
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_filtered_wifi_signals_group ON filtered_wifi_signals (location_id, ssid_id)",
+    ],
+    # 3: Scans compacted by `compact.py` into one row, read back with the `rss_at` function of `db.py`
+    [
+        """
+        CREATE TABLE IF NOT EXISTS packed_scans (
+            scan_id INTEGER PRIMARY KEY,
+            first_ssid_id INTEGER,
+            rss BLOB,
+            FOREIGN KEY (scan_id) REFERENCES scans (id)
+        )
+        """,
+    ],
+    # 4: Cluster of every location, filled by `cluster.py` from `filtered_wifi_signals`
+    [
+        """
+        CREATE TABLE IF NOT EXISTS location_clusters (
+            location_id INTEGER PRIMARY KEY,
+            cluster_id INTEGER,
+            FOREIGN KEY (location_id) REFERENCES locations (id)
+        )
+        """,
+    ],
+    # 5: Settings stored with the data, such as whether `wifi_signals` leaves out unreachable signals
+    [
+        "CREATE TABLE IF NOT EXISTS settings (name TEXT PRIMARY KEY, value)",
+    ],
+    # 6: Last SSID known when a session was stored, so sparse readers fill in only the SSIDs it could have stored
+    [
+        "ALTER TABLE scan_sessions ADD COLUMN last_ssid_id INTEGER",
+    ],
+]
+
+def migrate_database(conn):
+    """
+    Apply the migrations newer than the `user_version` of the database, each in its own transaction.
+    A failed migration is rolled back, so the shared connection is not left inside its transaction.
+    """
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    for new_version, statements in enumerate(MIGRATIONS[version:], start=version + 1):
+        conn.execute("BEGIN")
+        try:
+            for statement in statements:
+                conn.execute(statement)
+            conn.execute(f"PRAGMA user_version = {new_version}")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+    return len(MIGRATIONS)
+
+def create_tables(conn):
+    """Create the tables of the initial schema."""
     cursor = conn.cursor()
 
     # Create the `locations` table
@@ -75,7 +146,86 @@ def initialize_database():
     """)
 
     conn.commit()
-    conn.close()
+
+def initialize_database():
+    """Initialize the database with the required tables and bring it to the latest schema version."""
+    conn = get_connection()
+    create_tables(conn)
+    migrate_database(conn)
+
+def has_packed_scans(conn):
+    """Return True if `compact.py` has packed scans of the database, which readers then have to unpack."""
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'packed_scans'").fetchone():
+        return False
+    return conn.execute("SELECT EXISTS (SELECT 1 FROM packed_scans)").fetchone()[0] == 1
+
+def has_sparse_signals(conn):
+    """Return True if the database stores detected signals only, so readers have to fill in RSS_FOR_UNREACHABLE."""
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'settings'").fetchone():
+        return False
+    row = conn.execute("SELECT value FROM settings WHERE name = 'sparse_signals'").fetchone()
+    return row is not None and row[0] == 1
+
+def mark_sparse_signals(conn):
+    """Record that unreachable signals may be left out, in the transaction that leaves them out."""
+    conn.execute("INSERT OR REPLACE INTO settings (name, value) VALUES ('sparse_signals', 1)")
+
+def get_wifi_signals_source(conn):
+    """Return the `wifi_signals_source` the database of the connection is stored in, sparse or dense and packed or not."""
+    return wifi_signals_source(not has_sparse_signals(conn), has_packed_scans(conn))
+
+def wifi_signals_source(store_unreachable=True, packed=False):
+    """
+    SQL to read in place of the `wifi_signals` table, with the columns `scan_id`, `ssid_id` and `rss`.
+    In sparse storage every (scan, SSID) pair without a row reads as RSS_FOR_UNREACHABLE.
+    With `packed` the signals of `packed_scans` are unpacked into rows too; this needs a connection from `db.py`.
+    """
+    if store_unreachable and not packed:
+        return "wifi_signals"
+    if packed:
+        rss = "COALESCE(w.rss, rss_at(p.rss, s.id - p.first_ssid_id))"
+        packed_join = "LEFT JOIN packed_scans p ON p.scan_id = sc.id"
+    else:
+        rss = "w.rss"
+        packed_join = ""
+    if store_unreachable:
+        rss_column, session_join, condition = rss, "", f"WHERE {rss} IS NOT NULL"
+    else:
+        # SSIDs added after a session was stored were never stored for it, as in dense storage
+        rss_column = f"COALESCE({rss}, {int(RSS_FOR_UNREACHABLE)})"
+        session_join = "JOIN scan_sessions ss ON ss.id = sc.session_id"
+        condition = f"WHERE {rss} IS NOT NULL OR ss.last_ssid_id IS NULL OR s.id <= ss.last_ssid_id"
+    return f"""(
+        SELECT sc.id AS scan_id, s.id AS ssid_id, {rss_column} AS rss
+        FROM scans sc
+        {session_join}
+        CROSS JOIN ssids s
+        LEFT JOIN wifi_signals w ON w.scan_id = sc.id AND w.ssid_id = s.id
+        {packed_join}
+        {condition}
+    )"""
+
+def make_wifi_signals_sparse():
+    """
+    Delete the stored RSS_FOR_UNREACHABLE rows and mark the database sparse, so readers fill them back in.
+    The last SSID of each session is recorded first, while dense storage still holds a row for every SSID it knew.
+    """
+    conn = get_connection()
+    migrate_database(conn)
+    with conn:
+        cursor = conn.cursor()
+        if not has_sparse_signals(cursor):
+            cursor.execute(f"""
+                UPDATE scan_sessions SET last_ssid_id = (
+                    SELECT MAX(w.ssid_id) FROM {get_wifi_signals_source(conn)} w JOIN scans sc ON w.scan_id = sc.id
+                    WHERE sc.session_id = scan_sessions.id
+                )
+                WHERE last_ssid_id IS NULL
+            """)
+        mark_sparse_signals(cursor)
+        cursor.execute("DELETE FROM wifi_signals WHERE rss = ?", (RSS_FOR_UNREACHABLE,))
+        deleted_count = cursor.rowcount
+    return deleted_count
 
 if __name__ == "__main__":
     initialize_database()
\ No newline at end of file
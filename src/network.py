@@ -1,11 +1,19 @@
 import re
+import time
+import random
+from math import sqrt, pi
+import queue
+import threading
 import subprocess
 from time import sleep
-from statistics import median, variance
-from config import DELAY_BETWEEN_SCANS
+from statistics import median, mode
+from config import DELAY_BETWEEN_SCANS, SCAN_QUEUE_SIZE, SKIP_STALE_SCANS, ADAPTIVE_SCAN_INTERVAL, SCAN_MIN_INTERVAL, SCAN_MAX_INTERVAL
+from config import SCAN_BACKEND, ScanBackend, AGGREGATOR_SAMPLE_SIZE, AggregationType
+from config import AGGREGATION, FINGERPRINT_CONFIDENCE_Z, FINGERPRINT_CONFIDENCE_HALF_WIDTH
+from replay import ScanReplayer, load_scans
 from pywifi import PyWiFi, const
 
-USE_PI_WIFI = True
+replayer = None
 
 def get_rss(signal):
     """
@@ -102,77 +110,257 @@ def scan_wifi_networks_piwifi():
 
     return networks
 
+def scan_wifi_networks_replay():
+    """Return the next recorded scan, loading the recording on first use."""
+    global replayer
+    if replayer is None:
+        replayer = ScanReplayer(load_scans())
+    return replayer.next_scan()
+
 def get_networks():
     """
     Process the list of networks and return them in the format {ssid, bssid, rss}.
     """
-    if USE_PI_WIFI:
+    if SCAN_BACKEND == ScanBackend.PIWIFI:
         return scan_wifi_networks_piwifi()
-    else:
+    elif SCAN_BACKEND == ScanBackend.NETSH:
         return scan_wifi_networks_netsh()
+    else:
+        return scan_wifi_networks_replay()
 
-def get_networks_with_mean_rss(scan_count=10, sleep_time=DELAY_BETWEEN_SCANS):
+def scan_fingerprint(networks):
+    """Identify a scan result by its BSSIDs and their RSS, to recognize a driver returning its cached result again."""
+    return frozenset((network["bssid"], network["rss"]) for network in networks)
+
+def is_stale_scan(networks, last_fingerprint):
+    """Return whether the scan repeats the scan of `last_fingerprint`. An empty scan is never stale."""
+    return bool(networks) and scan_fingerprint(networks) == last_fingerprint
+
+class BackgroundScanner:
     """
-    Get the average rss of the networks over multiple scans.
+    Scan on a background thread and put every result, with the time it was taken, into a bounded queue.
+    Consumers match, store or draw one scan while the next one is being taken. When the queue is full the oldest
+    result is dropped, so live consumers always get recent scans, or with `drop_oldest=False` the scanner waits.
+    With `skip_stale` a scan repeating the previous one is counted in `stale_count` instead of being queued, and
+    with `adaptive` the interval backs off while the driver returns cached results and shrinks again while they are new.
+    A scan that raises stops the scanner, and its error is raised to the consumer after the scans taken before it.
     """
-    avg_networks = []
-    rss_data = {}
-    for _ in range(scan_count):
-        networks = get_networks()
+
+    def __init__(self, interval=None, queue_size=SCAN_QUEUE_SIZE, drop_oldest=True, scan=None,
+                 skip_stale=SKIP_STALE_SCANS, adaptive=ADAPTIVE_SCAN_INTERVAL, min_interval=SCAN_MIN_INTERVAL, max_interval=SCAN_MAX_INTERVAL):
+        if interval is None:
+            interval = 0 if SCAN_BACKEND == ScanBackend.REPLAY else DELAY_BETWEEN_SCANS  # A replay keeps its own pace
+        self.interval = interval
+        self.drop_oldest = drop_oldest
+        self.scan = scan or get_networks
+        self.skip_stale = skip_stale
+        self.adaptive = adaptive
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.stale_count = 0
+        self.error = None
+        self.results = queue.Queue(maxsize=queue_size)
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def run(self):
+        last_fingerprint = None
+        while not self.stopped.is_set():
+            started = time.monotonic()
+            try:
+                networks = self.scan()
+            except Exception as error:
+                self.error = error
+                return
+            stale = is_stale_scan(networks, last_fingerprint)
+            last_fingerprint = scan_fingerprint(networks)
+            if self.adaptive:
+                self.adapt_interval(stale)
+            if stale:
+                self.stale_count += 1
+            if not (stale and self.skip_stale):
+                self.put((time.time(), networks))
+            self.stopped.wait(max(0, self.interval - (time.monotonic() - started)))
+
+    def adapt_interval(self, stale):
+        """
+        Back off by half after a cached result and come back by a tenth after a new one, which settles
+        where about one poll in five returns a cached result, just faster than the driver refreshes.
+        """
+        if stale:
+            self.interval = min(self.max_interval, max(self.interval, self.min_interval) * 1.5)
+        elif self.interval > self.min_interval:
+            self.interval = max(self.min_interval, self.interval * 0.9)
+
+    def put(self, result):
+        while not self.stopped.is_set():
+            try:
+                self.results.put(result, timeout=0.1)
+                return
+            except queue.Full:
+                if self.drop_oldest:
+                    try:
+                        self.results.get_nowait()
+                    except queue.Empty:
+                        pass
+
+    def get(self, timeout=None):
+        """
+        Return the next (timestamp, networks), waiting for it. Raises `queue.Empty` after `timeout` seconds,
+        and the error of a failed scan once the scans before it have been returned.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            failed = self.error is not None
+            try:
+                return self.results.get(timeout=0.1 if deadline is None else min(0.1, max(0, deadline - time.monotonic())))
+            except queue.Empty:
+                if failed:
+                    raise self.error
+                if deadline is not None and time.monotonic() >= deadline:
+                    raise
+
+    def get_all(self):
+        """Return every (timestamp, networks) waiting in the queue, without blocking. Raises the error of a failed scan once none are left."""
+        results = []
+        while True:
+            try:
+                results.append(self.results.get_nowait())
+            except queue.Empty:
+                if not results and self.error is not None:
+                    raise self.error
+                return results
+
+def get_timestamped_networks(scanner=None):
+    """Return (timestamp, networks) of the next scan of `scanner`, or of a scan taken now without one."""
+    if scanner is None:
+        return time.time(), get_networks()
+    return scanner.get()
+
+class NetworkAggregator:
+    """
+    Running statistics of every BSSID over any number of scans, in memory and time independent of the scan count.
+    Mean and variance are updated with Welford's method; medians and modes come from a uniform reservoir sample
+    of at most `sample_size` RSS values per BSSID, so they are exact up to that many scans.
+    With `missing_rss` a BSSID counts in every scan, at that RSS in the scans that missed it, as stored fingerprints do.
+    """
+
+    def __init__(self, sample_size=AGGREGATOR_SAMPLE_SIZE, seed=None, missing_rss=None):
+        self.sample_size = sample_size
+        self.random = random.Random(seed)
+        self.missing_rss = missing_rss
+        self.scan_count = 0
+        self.networks = {}
+
+    def add(self, networks):
+        """Add the networks of one scan."""
+        self.scan_count += 1
         for network in networks:
-            ssid = network["ssid"]
-            bssid = network["bssid"]
-            rss = network["rss"]
-            if (ssid, bssid) not in rss_data:
-                rss_data[(ssid, bssid)] = []
-            rss_data[(ssid, bssid)].append(rss)
-            found = False
-            for avg_network in avg_networks:
-                if avg_network["ssid"] == ssid and avg_network["bssid"] == bssid:
-                    avg_network["rss"] += rss
-                    avg_network["count"] += 1
-                    found = True
-                    break
-            if not found:
-                avg_networks.append({"ssid": ssid, "bssid": bssid, "rss": rss, "count": 1})
-        sleep(sleep_time)
+            stats = self.networks.get(network["bssid"])
+            if stats is None:
+                stats = self.networks[network["bssid"]] = self.new_stats(network["ssid"])
+            self.add_rss(stats, network["rss"])
+        if self.missing_rss is not None:
+            for stats in self.networks.values():
+                if stats["count"] < self.scan_count:  # Missed in this scan
+                    self.add_rss(stats, self.missing_rss)
+
+    def new_stats(self, ssid):
+        if self.missing_rss is None or self.scan_count == 1:
+            return {"ssid": ssid, "count": 0, "mean": 0.0, "m2": 0.0, "samples": []}
+        missed = self.scan_count - 1  # The earlier scans missed it
+        return {"ssid": ssid, "count": missed, "mean": float(self.missing_rss), "m2": 0.0,
+                "samples": [self.missing_rss] * min(missed, self.sample_size)}
 
-    for avg_network in avg_networks:
-        avg_network["rss"] /= avg_network["count"]
-        if len(rss_data[(avg_network["ssid"], avg_network["bssid"])]) > 1:
-            avg_network["variance"] = variance(rss_data[(avg_network["ssid"], avg_network["bssid"])])
+    def add_rss(self, stats, rss):
+        stats["count"] += 1
+        delta = rss - stats["mean"]
+        stats["mean"] += delta / stats["count"]
+        stats["m2"] += delta * (rss - stats["mean"])
+
+        samples = stats["samples"]
+        if len(samples) < self.sample_size:
+            samples.append(rss)
         else:
-            avg_network["variance"] = 0
+            slot = self.random.randrange(stats["count"])
+            if slot < self.sample_size:
+                samples[slot] = rss
 
-    return avg_networks
+    def get_unsettled_bssids(self, half_width=FINGERPRINT_CONFIDENCE_HALF_WIDTH, z=FINGERPRINT_CONFIDENCE_Z, aggregation=AGGREGATION):
+        """
+        Return the BSSIDs whose aggregated RSS is not yet known to within `half_width` dB at the confidence of `z`.
+        The median is taken as normal RSS would have it, with a standard error sqrt(pi / 2) times that of the mean.
+        """
+        unsettled = []
+        for bssid, stats in self.networks.items():
+            if stats["count"] < 2:
+                unsettled.append(bssid)
+                continue
+            standard_error = sqrt(stats["m2"] / (stats["count"] - 1) / stats["count"])
+            if aggregation == AggregationType.MEDIAN:
+                standard_error *= sqrt(pi / 2)
+            if z * standard_error > half_width:
+                unsettled.append(bssid)
+        return unsettled
 
-def get_networks_with_median_rss(scan_count=10, sleep_time=DELAY_BETWEEN_SCANS):
+    def get_networks(self, aggregation=AggregationType.MEAN):
+        """Return {ssid, bssid, rss, count, variance} of every BSSID heard, with the RSS aggregated by `aggregation`."""
+        networks = []
+        for bssid, stats in self.networks.items():
+            if aggregation == AggregationType.MEAN or not stats["samples"]:
+                rss = stats["mean"]
+            elif aggregation == AggregationType.MEDIAN:
+                rss = median(stats["samples"])
+            else:
+                rss = mode(stats["samples"])
+            networks.append({
+                "ssid": stats["ssid"],
+                "bssid": bssid,
+                "rss": rss,
+                "count": stats["count"],
+                "variance": stats["m2"] / (stats["count"] - 1) if stats["count"] > 1 else 0
+            })
+        return networks
+
+def aggregate_networks(scan_count=10, sleep_time=DELAY_BETWEEN_SCANS, aggregation=AggregationType.MEAN):
     """
-    Get the median rss of the networks over multiple scans.
+    Get the networks aggregated over multiple scans.
     """
-    rss_data = {}
+    aggregator = NetworkAggregator()
+    last_fingerprint = None
     for _ in range(scan_count):
         networks = get_networks()
-        for network in networks:
-            ssid = network["ssid"]
-            bssid = network["bssid"]
-            rss = network["rss"]
-            if (ssid, bssid) not in rss_data:
-                rss_data[(ssid, bssid)] = []
-            rss_data[(ssid, bssid)].append(rss)
+        if not is_stale_scan(networks, last_fingerprint):  # A cached result is not another sample
+            aggregator.add(networks)
+        last_fingerprint = scan_fingerprint(networks)
         sleep(sleep_time)
+    return aggregator.get_networks(aggregation)
 
-    median_networks = []
-    for (ssid, bssid), rss in rss_data.items():
-        median_networks.append({
-            "ssid": ssid,
-            "bssid": bssid,
-            "rss": median(rss),
-            "count": len(rss),
-            "variance": variance(rss) if len(rss) > 1 else 0
-        })
+def get_networks_with_mean_rss(scan_count=10, sleep_time=DELAY_BETWEEN_SCANS):
+    """
+    Get the average rss of the networks over multiple scans.
+    """
+    return aggregate_networks(scan_count, sleep_time, AggregationType.MEAN)
 
-    return median_networks
+def get_networks_with_median_rss(scan_count=10, sleep_time=DELAY_BETWEEN_SCANS):
+    """
+    Get the median rss of the networks over multiple scans.
+    """
+    return aggregate_networks(scan_count, sleep_time, AggregationType.MEDIAN)
 
 if __name__ == "__main__":
     networks = get_networks()
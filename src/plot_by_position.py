@@ -1,5 +1,4 @@
 import sys
-import sqlite3
 import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
@@ -8,7 +7,8 @@ from matplotlib import cm
 from scipy.interpolate import griddata
 from PyQt5.QtWidgets import QApplication, QMainWindow, QVBoxLayout, QWidget, QCheckBox, QHBoxLayout, QPushButton, QScrollArea, QSplitter
 from PyQt5.QtCore import Qt
-from config import DB_FILE_PATH, USE_INTERPOLATION, INTERPOLATION_METHOD
+from db import get_connection
+from config import USE_INTERPOLATION, INTERPOLATION_METHOD
 
 class PlotWindow(QMainWindow):
     def __init__(self):
@@ -56,7 +56,7 @@ class PlotWindow(QMainWindow):
 
     def fetch_rssi_data(self):
         """Fetch filtered RSSI data from the database."""
-        conn = sqlite3.connect(DB_FILE_PATH)
+        conn = get_connection()
         cursor = conn.cursor()
         cursor.execute("""
             SELECT s.ssid, s.bssid, f.agg_rss, l.x, l.y, l.floor
@@ -66,7 +66,6 @@ class PlotWindow(QMainWindow):
             ORDER BY l.x, l.y, l.floor
         """)
         data = cursor.fetchall()
-        conn.close()
         return data
 
     def prepare_plot(self):
@@ -1,12 +1,13 @@
 import sys
-import sqlite3
 from datetime import datetime
 import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 from PyQt5.QtWidgets import QApplication, QMainWindow, QVBoxLayout, QWidget, QComboBox, QCheckBox, QHBoxLayout, QPushButton, QScrollArea, QSplitter
 from PyQt5.QtCore import Qt
-from config import DB_FILE_PATH, EXP_FILTER_ALPHA, MOVING_AVERAGE_WINDOW
+from db import get_connection
+from config import EXP_FILTER_ALPHA, MOVING_AVERAGE_WINDOW
+from model import get_wifi_signals_source
 
 class PlotWindow(QMainWindow):
     def __init__(self):
@@ -68,20 +69,19 @@ class PlotWindow(QMainWindow):
 
     def fetch_locations(self):
         """Fetch all locations from the database."""
-        conn = sqlite3.connect(DB_FILE_PATH)
+        conn = get_connection()
         cursor = conn.cursor()
         cursor.execute("SELECT id, x, y, floor, location_name FROM locations")
         locations = cursor.fetchall()
-        conn.close()
         return locations
 
     def fetch_rssi_data(self, location_id):
         """Fetch RSSI data from the database for a specific location."""
-        conn = sqlite3.connect(DB_FILE_PATH)
+        conn = get_connection()
         cursor = conn.cursor()
-        cursor.execute("""
+        cursor.execute(f"""
             SELECT s.ssid, s.bssid, w.rss, sc.scan_time
-            FROM wifi_signals w
+            FROM {get_wifi_signals_source(conn)} w
             JOIN scans sc ON w.scan_id = sc.id
             JOIN ssids s ON w.ssid_id = s.id
             JOIN scan_sessions ss ON sc.session_id = ss.id
@@ -89,7 +89,6 @@ class PlotWindow(QMainWindow):
             ORDER BY sc.scan_time
         """, (location_id,))
         data = cursor.fetchall()
-        conn.close()
         return data
 
     def on_location_select(self):
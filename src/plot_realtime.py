@@ -7,7 +7,7 @@ from PyQt5.QtWidgets import QApplication, QMainWindow, QVBoxLayout, QWidget, QCo
 from PyQt5.QtCore import Qt, QTimer
 from config import EXP_FILTER_ALPHA, MOVING_AVERAGE_WINDOW, DELAY_BETWEEN_SCANS
 
-from network import get_networks
+from network import BackgroundScanner
 
 WINDOW_TIME = 20  # Window time in seconds
 
@@ -59,14 +59,18 @@ class RealTimePlotWindow(QMainWindow):
         self.ssid_checkboxes = {}
         self.ssid_data = {}
         self.start_time = time.time()
+        self.scanner = BackgroundScanner().start()  # Scanning blocks, so it must not run on the Qt thread
 
         self.timer = QTimer(self)
         self.timer.timeout.connect(self.update_plot)
         self.timer.start(int(DELAY_BETWEEN_SCANS * 1000))
 
     def update_plot(self):
-        current_time = time.time() - self.start_time
-        networks = get_networks()
+        for timestamp, networks in self.scanner.get_all():
+            self.add_scan(timestamp - self.start_time, networks)
+        self.apply_filter()
+
+    def add_scan(self, current_time, networks):
         for network in networks:
             ssid = network["ssid"]
             bssid = network["bssid"]
@@ -90,7 +94,9 @@ class RealTimePlotWindow(QMainWindow):
                 self.ssid_data[bssid]["time"].pop(0)
                 self.ssid_data[bssid]["rss"].pop(0)
 
-        self.apply_filter()
+    def closeEvent(self, event):
+        self.scanner.stop()
+        super().closeEvent(event)
 
     def toggle_visibility(self):
         checkbox = self.sender()
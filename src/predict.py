@@ -1,35 +1,52 @@
-import sqlite3
+import os
 import numpy as np
 import csv
 import time
 from math import sqrt
-from network import get_networks
-from config import DB_FILE_PATH, FILTER, FilterType, MOVING_AVERAGE_WINDOW, EXP_FILTER_ALPHA, USE_AGGREGATION, K, STRUCTURED_FINGERPRINTS_FILE
+from scipy.spatial import cKDTree
+from network import BackgroundScanner, get_timestamped_networks
+from model import wifi_signals_source, get_wifi_signals_source, has_packed_scans, migrate_database
+from db import connect, get_connection
+from radio_map_file import load_radio_map_file
+from config import FILTER, FilterType, MOVING_AVERAGE_WINDOW, EXP_FILTER_ALPHA, FILTER_MAX_MISSED_SCANS, KALMAN_PROCESS_NOISE, KALMAN_MEASUREMENT_NOISE, USE_AGGREGATION, K, STRUCTURED_FINGERPRINTS_FILE, PREDICT_BATCH_SIZE, RSS_FOR_UNREACHABLE
+from config import INDEX, IndexType, INDEX_MIN_LOCATIONS, USE_CLUSTERING, CLUSTERS_TO_SEARCH
+from config import MATCHING, MatchingType, MIN_RSS_VARIANCE, DEFAULT_RSS_VARIANCE, USE_VIRTUAL_GRID, VIRTUAL_GRID_FILE_PATH, USE_RADIO_MAP_FILE, RADIO_MAP_FILE_PATH
 
-def get_fingerprints_from_db(use_aggregation=True):
-    """Retrieve all Wi-Fi fingerprints from the database."""
-    conn = sqlite3.connect(DB_FILE_PATH)
+RSS_FOR_MISSING = -100  # RSS assumed for a BSSID that a location has no fingerprint for
+FINGERPRINT_FIELDS = ("location_id", "x", "y", "floor")
+
+def get_fingerprints_from_db(use_aggregation=True, location_ids=None, db_file_path=None):
+    """Retrieve all Wi-Fi fingerprints, or those of the given locations, from the database."""
+    conn = get_connection(db_file_path)
     cursor = conn.cursor()
+
+    location_filter = ""
+    params = ()
+    if location_ids is not None:
+        location_ids = list(location_ids)
+        location_filter = f"WHERE l.id IN ({', '.join('?' * len(location_ids))})"
+        params = tuple(location_ids)
     
     if use_aggregation:
-        cursor.execute("""
+        cursor.execute(f"""
             SELECT l.id, l.x, l.y, l.floor, s.bssid, f.agg_rss
             FROM filtered_wifi_signals f
             JOIN locations l ON f.location_id = l.id
             JOIN ssids s ON f.ssid_id = s.id
-        """)
+            {location_filter}
+        """, params)
     else:
-        cursor.execute("""
+        cursor.execute(f"""
             SELECT l.id, l.x, l.y, l.floor, s.bssid, w.rss
-            FROM wifi_signals w
-            JOIN wifi_scans sc ON w.scan_id = sc.id
+            FROM {get_wifi_signals_source(conn)} w
+            JOIN scans sc ON w.scan_id = sc.id
             JOIN scan_sessions ss ON sc.session_id = ss.id
             JOIN locations l ON ss.location_id = l.id
             JOIN ssids s ON w.ssid_id = s.id
-        """)
+            {location_filter}
+        """, params)
     
     fingerprints = cursor.fetchall()
-    conn.close()
     return fingerprints
 
 def structure_data(fingerprints):
@@ -65,98 +82,633 @@ def calculate_distance(rssi1, rssi2):
     """Calculate the Euclidean distance between two RSSI values."""
     return np.sqrt(np.sum((np.array(rssi1) - np.array(rssi2)) ** 2))
 
-def find_location(structured_fingerprints, real_time_networks, k=K, use_aggregation=True):
-    """Find the location using the W_KNN algorithm."""
-    distances = []
+def build_fingerprint_matrix(structured_fingerprints):
+    """Build a dense locations x BSSIDs RSS matrix and a BSSID to column index."""
+    bssid_index = {}
     for fingerprint in structured_fingerprints:
-        location_id = fingerprint["location_id"]
-        x = fingerprint["x"]
-        y = fingerprint["y"]
-        floor = fingerprint["floor"]
-        rss_values = [fingerprint.get(rt_network["bssid"], -100) for rt_network in real_time_networks]
+        for key in fingerprint:
+            if key not in FINGERPRINT_FIELDS and key not in bssid_index:
+                bssid_index[key] = len(bssid_index)
+
+    rss = np.full((len(structured_fingerprints), len(bssid_index)), RSS_FOR_MISSING, dtype=float)
+    for row, fingerprint in enumerate(structured_fingerprints):
+        for key, value in fingerprint.items():
+            if key in bssid_index:
+                rss[row, bssid_index[key]] = value
+
+    return {
+        "bssid_index": bssid_index,
+        "rss": rss,
+        "location_id": np.array([f["location_id"] for f in structured_fingerprints], dtype=int),
+        "x": np.array([f["x"] for f in structured_fingerprints], dtype=float),
+        "y": np.array([f["y"] for f in structured_fingerprints], dtype=float),
+        "floor": np.array([f["floor"] for f in structured_fingerprints], dtype=int),
+    }
 
-        rt_rss_values = [rt_network["rss"] for rt_network in real_time_networks]
-        distance = calculate_distance(rss_values, rt_rss_values)
-        distances.append((distance, location_id, x, y, floor))
+def update_fingerprint_matrix(radio_map, changed_fingerprints, removed_location_ids=()):
+    """
+    Build a new fingerprint matrix from `radio_map` with the rows of changed locations replaced and removed ones dropped.
+    Unchanged rows are copied as they are; new BSSIDs get new columns.
+    """
+    bssid_index = dict(radio_map["bssid_index"])
+    for fingerprint in changed_fingerprints:
+        for key in fingerprint:
+            if key not in FINGERPRINT_FIELDS and key not in bssid_index:
+                bssid_index[key] = len(bssid_index)
 
-    # Sort by distance and get the k-nearest neighbors
-    distances.sort(key=lambda x: x[0])
-    nearest_neighbors = distances[:k]
+    replaced_ids = [f["location_id"] for f in changed_fingerprints] + list(removed_location_ids)
+    keep = np.flatnonzero(~np.isin(radio_map["location_id"], replaced_ids))
+    old_rss = radio_map["rss"]
 
-    if not nearest_neighbors:
+    rss = np.full((len(keep) + len(changed_fingerprints), len(bssid_index)), RSS_FOR_MISSING, dtype=float)
+    rss[:len(keep), :old_rss.shape[1]] = old_rss[keep]
+    for row, fingerprint in enumerate(changed_fingerprints, start=len(keep)):
+        for key, value in fingerprint.items():
+            if key in bssid_index:
+                rss[row, bssid_index[key]] = value
+
+    updated_map = {"bssid_index": bssid_index, "rss": rss}
+    for field in FINGERPRINT_FIELDS:
+        changed_values = np.array([f[field] for f in changed_fingerprints], dtype=radio_map[field].dtype)
+        updated_map[field] = np.concatenate([radio_map[field][keep], changed_values])
+    return updated_map
+
+def calculate_distances(radio_map, real_time_networks, rows=None):
+    """Calculate the Euclidean distance from the real-time networks to every location, or to the given rows, at once."""
+    bssid_index = radio_map["bssid_index"]
+    columns = np.array([bssid_index.get(network["bssid"], -1) for network in real_time_networks], dtype=int)
+    rt_rss = np.array([network["rss"] for network in real_time_networks], dtype=float)
+    known = columns >= 0
+
+    # BSSIDs missing from the map contribute the same amount to every location
+    unknown_sq = np.sum((RSS_FOR_MISSING - rt_rss[~known]) ** 2)
+    rss = radio_map["rss"] if rows is None else radio_map["rss"][rows]
+    diff = rss[:, columns[known]] - rt_rss[known]
+    return np.sqrt(np.einsum("ij,ij->i", diff, diff) + unknown_sq)
+
+def weighted_average(radio_map, distances, k=K, rows=None):
+    """
+    Weighted average of the k nearest locations, weighted by inverse distance.
+    `rows` gives the map row of each distance when only some locations were scored.
+    """
+    if distances.size == 0:
         return None, None, None
 
-    # Calculate the weighted average of the nearest neighbors
-    weight_sum = np.sum([1 / d[0] for d in nearest_neighbors if d[0] != 0])
-    if weight_sum == 0:
+    # Partial selection of every location within the k-th distance, then order only those,
+    # breaking ties at the k-th distance by map row as a stable sort over all locations would
+    candidates = np.arange(distances.size)
+    if k < distances.size:
+        candidates = np.flatnonzero(distances <= np.partition(distances, k - 1)[k - 1])
+    candidate_rows = candidates if rows is None else rows[candidates]
+    order = np.lexsort((candidate_rows, distances[candidates]))[:k]
+
+    nearest_distances = distances[candidates[order]]
+    nearest = candidate_rows[order]
+    nonzero = nearest_distances != 0
+    if not nonzero.any():
         return None, None, None  # Handle the case where weight_sum is zero
 
-    x = np.sum([(1 / d[0]) * d[2] for d in nearest_neighbors if d[0] != 0]) / weight_sum
-    y = np.sum([(1 / d[0]) * d[3] for d in nearest_neighbors if d[0] != 0]) / weight_sum
-    floor = nearest_neighbors[0][4]  # Assuming the floor is the same for the nearest neighbors
+    weights = 1 / nearest_distances[nonzero]
+    weight_sum = np.sum(weights)
+    x = np.sum(weights * radio_map["x"][nearest][nonzero]) / weight_sum
+    y = np.sum(weights * radio_map["y"][nearest][nonzero]) / weight_sum
+    floor = radio_map["floor"][nearest[0]]  # Assuming the floor is the same for the nearest neighbors
 
     return x, y, floor
 
-def moving_average_filter(data, window_size):
-    """Apply a moving average filter to the data."""
-    filtered_data = []
-    for i in range(len(data)):
-        if i < window_size:
-            filtered_data.append(data[i])
+def build_index(radio_map, min_locations=INDEX_MIN_LOCATIONS):
+    """
+    Build one KD-tree per floor over the full RSS vectors of the radio map.
+    Floors with fewer than `min_locations` locations keep no tree and are searched by brute force, on the same distances.
+    """
+    floors = np.unique(radio_map["floor"])
+    rows = [np.flatnonzero(radio_map["floor"] == floor) for floor in floors]
+    radio_map["index"] = {
+        "floors": floors,
+        "rows": rows,
+        "centroids": np.array([radio_map["rss"][floor_rows].mean(axis=0) for floor_rows in rows]),
+        "trees": [cKDTree(radio_map["rss"][floor_rows]) if len(floor_rows) >= min_locations else None for floor_rows in rows],
+    }
+    return radio_map
+
+def build_full_query(radio_map, real_time_networks):
+    """Build a query over every BSSID of the map, with BSSIDs not heard at the RSS_FOR_MISSING the map is filled with."""
+    bssid_index = radio_map["bssid_index"]
+    query = np.full(len(bssid_index), RSS_FOR_MISSING, dtype=float)
+    unknown_sq = 0.0
+    for network in real_time_networks:
+        column = bssid_index.get(network["bssid"])
+        if column is None:
+            unknown_sq += (RSS_FOR_MISSING - network["rss"]) ** 2
         else:
-            window = data[i - window_size:i]
-            avg = sum(window) / window_size
-            filtered_data.append(avg)
-    return filtered_data
-
-def exponential_filter(data, alpha):
-    """Apply an exponential filter to the data."""
-    filtered_data = [data[0]]  # Initialize with the first value
-    for i in range(1, len(data)):
-        filtered_value = alpha * data[i] + (1 - alpha) * filtered_data[-1]
-        filtered_data.append(filtered_value)
-    return filtered_data
-
-def filter_real_time_networks(real_time_networks, filter_type):
-    """Filter the real-time networks based on the specified filter type."""
+            query[column] = network["rss"]
+    return query, unknown_sq
+
+def calculate_full_distances(radio_map, query, unknown_sq, rows):
+    """Calculate the Euclidean distance from a full query to the given rows, over every BSSID of the map."""
+    diff = radio_map["rss"][rows] - query
+    return np.sqrt(np.einsum("ij,ij->i", diff, diff) + unknown_sq)
+
+def find_location_indexed(radio_map, real_time_networks, k=K, floor=None):
+    """
+    Find the location using W_KNN over the per-floor index, on the given floor or the floor nearest to the scan.
+    Unlike the default path, distances are over every BSSID of the map, with those the scan did not hear at RSS_FOR_MISSING,
+    so that they fit a KD-tree. A tree only collects the candidates, so a floor gives the same answer with or without one.
+    """
+    if not real_time_networks:
+        return None, None, None
+
+    index = radio_map["index"]
+    query, unknown_sq = build_full_query(radio_map, real_time_networks)
+    if floor is None:
+        slot = np.argmin(np.sum((index["centroids"] - query) ** 2, axis=1))
+    else:
+        slot = np.searchsorted(index["floors"], floor)
+        if slot == len(index["floors"]) or index["floors"][slot] != floor:
+            return None, None, None
+
+    rows = index["rows"][slot]
+    tree = index["trees"][slot]
+    if tree is not None and k < len(rows):
+        # Every location within the k-th distance, so that ties are broken by row as without a tree
+        kth_distance = tree.query(query, k=[k])[0][0]
+        rows = rows[np.sort(tree.query_ball_point(query, kth_distance * (1 + 1e-9) + 1e-9))]
+    return weighted_average(radio_map, calculate_full_distances(radio_map, query, unknown_sq, rows), k, rows)
+
+def get_location_clusters_from_db(db_file_path=None):
+    """Retrieve the cluster of every clustered location from the database."""
+    conn = get_connection(db_file_path)
+    migrate_database(conn)
+    cursor = conn.cursor()
+    cursor.execute("SELECT location_id, cluster_id FROM location_clusters")
+    clusters = dict(cursor.fetchall())
+    return clusters
+
+def build_clusters(radio_map, clusters):
+    """
+    Attach the stored cluster assignments and their centroids to the radio map.
+    Locations added after clustering belong to no cluster and are always searched.
+    Without any stored cluster, as before `cluster.py` has run, every location is searched by brute force.
+    """
+    labels = np.array([clusters.get(location_id, -1) for location_id in radio_map["location_id"].tolist()], dtype=int)
+    cluster_ids = np.unique(labels[labels >= 0])
+    if cluster_ids.size == 0:
+        radio_map.pop("clusters", None)
+        return radio_map
+    rows = [np.flatnonzero(labels == cluster_id) for cluster_id in cluster_ids]
+    radio_map["clusters"] = {
+        "rows": rows,
+        "unclustered_rows": np.flatnonzero(labels < 0),
+        "centroids": {
+            "bssid_index": radio_map["bssid_index"],
+            "rss": np.array([radio_map["rss"][cluster_rows].mean(axis=0) for cluster_rows in rows]).reshape(len(rows), -1),
+        },
+    }
+    return radio_map
+
+def find_location_clustered(radio_map, real_time_networks, k=K, clusters_to_search=CLUSTERS_TO_SEARCH):
+    """Find the location using W_KNN only inside the clusters whose centroids are nearest to the scan."""
+    clusters = radio_map["clusters"]
+    centroid_distances = calculate_distances(clusters["centroids"], real_time_networks)
+    if clusters_to_search < centroid_distances.size:
+        nearest_clusters = np.argpartition(centroid_distances, clusters_to_search - 1)[:clusters_to_search]
+    else:
+        nearest_clusters = np.arange(centroid_distances.size)
+
+    rows = np.concatenate([clusters["unclustered_rows"]] + [clusters["rows"][i] for i in nearest_clusters])
+    distances = calculate_distances(radio_map, real_time_networks, rows)
+    return weighted_average(radio_map, distances, k, rows)
+
+def get_variances_from_db(db_file_path=None):
+    """Retrieve the RSS variance of every filtered fingerprint from the database."""
+    conn = get_connection(db_file_path)
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT f.location_id, s.bssid, f.variance
+        FROM filtered_wifi_signals f
+        JOIN ssids s ON f.ssid_id = s.id
+    """)
+    variances = cursor.fetchall()
+    return variances
+
+def build_variance_matrix(radio_map, variances, min_variance=MIN_RSS_VARIANCE, default_variance=DEFAULT_RSS_VARIANCE):
+    """Return the RSS variance of every fingerprint, aligned with the RSS matrix."""
+    rows = {location_id: row for row, location_id in enumerate(radio_map["location_id"].tolist())}
+    bssid_index = radio_map["bssid_index"]
+    variance = np.full(radio_map["rss"].shape, default_variance, dtype=float)
+    for location_id, bssid, value in variances:
+        if location_id in rows and bssid in bssid_index and value is not None:
+            variance[rows[location_id], bssid_index[bssid]] = value
+    return np.maximum(variance, min_variance)
+
+def build_variance_matrices(radio_map, variances, min_variance=MIN_RSS_VARIANCE, default_variance=DEFAULT_RSS_VARIANCE):
+    """Attach the inverse and log variance matrices, aligned with the RSS matrix, to the radio map."""
+    return attach_variance_matrices(radio_map, build_variance_matrix(radio_map, variances, min_variance, default_variance))
+
+def attach_variance_matrices(radio_map, variance):
+    """Attach the inverse and log of a variance matrix, aligned with the RSS matrix, to the radio map."""
+    radio_map["inverse_variance"] = 1 / variance
+    radio_map["log_variance"] = np.log(variance)
+    return radio_map
+
+def calculate_log_likelihoods(radio_map, real_time_networks):
+    """Gaussian log-likelihood of the real-time networks at every location, over the BSSIDs of the map that were heard."""
+    bssid_index = radio_map["bssid_index"]
+    columns = np.array([bssid_index[network["bssid"]] for network in real_time_networks if network["bssid"] in bssid_index], dtype=int)
+    rt_rss = np.array([network["rss"] for network in real_time_networks if network["bssid"] in bssid_index], dtype=float)
+
+    diff = radio_map["rss"][:, columns] - rt_rss
+    squared = np.einsum("ij,ij->i", diff * diff, radio_map["inverse_variance"][:, columns])
+    return -0.5 * (squared + np.sum(radio_map["log_variance"][:, columns], axis=1))
+
+def find_location_gaussian(radio_map, real_time_networks):
+    """Find the location as the posterior-weighted position on the most probable floor."""
+    if not any(network["bssid"] in radio_map["bssid_index"] for network in real_time_networks):
+        return None, None, None
+
+    log_likelihoods = calculate_log_likelihoods(radio_map, real_time_networks)
+    posterior = np.exp(log_likelihoods - log_likelihoods.max())
+    posterior /= posterior.sum()
+
+    floors, floor_rows = np.unique(radio_map["floor"], return_inverse=True)
+    floor = floors[np.argmax(np.bincount(floor_rows, weights=posterior))]
+    on_floor = radio_map["floor"] == floor
+    weight_sum = np.sum(posterior[on_floor])
+
+    x = np.sum(posterior[on_floor] * radio_map["x"][on_floor]) / weight_sum
+    y = np.sum(posterior[on_floor] * radio_map["y"][on_floor]) / weight_sum
+    return x, y, floor
+
+def find_location(radio_map, real_time_networks, k=K, use_aggregation=True):
+    """Find the location using the W_KNN algorithm, or the Gaussian posterior when the map has variances."""
+    if "inverse_variance" in radio_map:
+        return find_location_gaussian(radio_map, real_time_networks)
+    if "clusters" in radio_map:
+        return find_location_clustered(radio_map, real_time_networks, k)
+    if "index" in radio_map:
+        return find_location_indexed(radio_map, real_time_networks, k)
+    distances = calculate_distances(radio_map, real_time_networks)
+    return weighted_average(radio_map, distances, k)
+
+def get_scans_from_db(session_id=None, include_unreachable=False):
+    """Retrieve stored scans as lists of networks, as `get_networks()` would have returned them."""
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    query = f"""
+        SELECT w.scan_id, s.ssid, s.bssid, w.rss
+        FROM {get_wifi_signals_source(conn) if include_unreachable else wifi_signals_source(True, has_packed_scans(conn))} w
+        JOIN scans sc ON w.scan_id = sc.id
+        JOIN ssids s ON w.ssid_id = s.id
+        WHERE (? IS NULL OR sc.session_id = ?) AND (? OR w.rss != ?)
+        ORDER BY w.scan_id
+    """
+    cursor.execute(query, (session_id, session_id, include_unreachable, RSS_FOR_UNREACHABLE))
+
+    scan_ids = []
+    scans = []
+    for scan_id, ssid, bssid, rss in cursor:
+        if not scan_ids or scan_ids[-1] != scan_id:
+            scan_ids.append(scan_id)
+            scans.append([])
+        scans[-1].append({"ssid": ssid, "bssid": bssid, "rss": rss})
+
+    return scan_ids, scans
+
+def build_query_matrix(radio_map, scans):
+    """Build the query RSS matrix and heard mask over the map's BSSIDs for a batch of scans."""
+    bssid_index = radio_map["bssid_index"]
+    rows = np.array([i for i, scan in enumerate(scans) for _ in scan], dtype=int)
+    columns = np.array([bssid_index.get(network["bssid"], -1) for scan in scans for network in scan], dtype=int)
+    rt_rss = np.array([network["rss"] for scan in scans for network in scan], dtype=float)
+    known = columns >= 0
+
+    query = np.zeros((len(scans), len(bssid_index)))
+    mask = np.zeros((len(scans), len(bssid_index)))
+    query[rows[known], columns[known]] = rt_rss[known]
+    mask[rows[known], columns[known]] = 1
+
+    # BSSIDs missing from the map contribute the same amount to every location
+    unknown_sq = np.bincount(rows[~known], weights=(RSS_FOR_MISSING - rt_rss[~known]) ** 2, minlength=len(scans))
+    return query, mask, unknown_sq
+
+def calculate_distance_matrix(radio_map, query, mask, unknown_sq):
+    """Calculate the queries x locations distance matrix, using only the BSSIDs each query heard."""
+    rss = radio_map["rss"]
+    squared = mask @ (rss ** 2).T - 2 * (query @ rss.T) + np.sum(query ** 2, axis=1)[:, None] + unknown_sq[:, None]
+    return np.sqrt(np.maximum(squared, 0))
+
+def weighted_average_many(radio_map, distances, k=K):
+    """Row-wise `weighted_average` over a queries x locations distance matrix."""
+    query_count, location_count = distances.shape
+    if location_count == 0:
+        return np.full(query_count, np.nan), np.full(query_count, np.nan), np.full(query_count, np.nan)
+
+    if k < location_count:
+        nearest = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        # Where more locations tie at the k-th distance than fit, take the first rows as `weighted_average` does
+        kth = np.take_along_axis(distances, nearest, axis=1).max(axis=1, keepdims=True)
+        tied = np.sum(distances <= kth, axis=1) > k
+        nearest[tied] = np.argsort(distances[tied], axis=1, kind="stable")[:, :k]
+        nearest = np.sort(nearest, axis=1)
+    else:
+        nearest = np.broadcast_to(np.arange(location_count), (query_count, location_count))
+    nearest_distances = np.take_along_axis(distances, nearest, axis=1)
+    order = np.argsort(nearest_distances, axis=1, kind="stable")
+    nearest = np.take_along_axis(nearest, order, axis=1)
+    nearest_distances = np.take_along_axis(nearest_distances, order, axis=1)
+
+    with np.errstate(divide="ignore"):
+        weights = np.where(nearest_distances != 0, 1 / nearest_distances, 0)
+    weight_sum = np.sum(weights, axis=1)
+    found = weight_sum != 0
+
+    with np.errstate(invalid="ignore"):
+        x = np.where(found, np.sum(weights * radio_map["x"][nearest], axis=1) / weight_sum, np.nan)
+        y = np.where(found, np.sum(weights * radio_map["y"][nearest], axis=1) / weight_sum, np.nan)
+    floor = np.where(found, radio_map["floor"][nearest[:, 0]], np.nan)
+    return x, y, floor
+
+def predict_many(radio_map, scans, k=K, batch_size=PREDICT_BATCH_SIZE):
+    """
+    Find the locations of a batch of scans using the W_KNN algorithm.
+    Scans are processed `batch_size` at a time so memory stays bounded; entries are NaN where no location is found.
+    """
+    x = np.full(len(scans), np.nan)
+    y = np.full(len(scans), np.nan)
+    floor = np.full(len(scans), np.nan)
+
+    for start in range(0, len(scans), batch_size):
+        end = min(start + batch_size, len(scans))
+        query, mask, unknown_sq = build_query_matrix(radio_map, scans[start:end])
+        distances = calculate_distance_matrix(radio_map, query, mask, unknown_sq)
+        x[start:end], y[start:end], floor[start:end] = weighted_average_many(radio_map, distances, k)
+
+    return x, y, floor
+
+class RssFilterState:
+    """
+    Per-BSSID filter state carried across successive scans of the live prediction path.
+    Each BSSID owns a slot in a ring buffer of its last `window_size` samples, an exponential average and a Kalman estimate;
+    a scan updates all of its BSSIDs in one array operation, and BSSIDs not seen for `max_missed_scans` scans are evicted.
+    """
+
+    def __init__(self, filter_type, window_size=MOVING_AVERAGE_WINDOW, alpha=EXP_FILTER_ALPHA, max_missed_scans=FILTER_MAX_MISSED_SCANS, capacity=64,
+                 process_noise=KALMAN_PROCESS_NOISE, measurement_noise=KALMAN_MEASUREMENT_NOISE):
+        self.filter_type = filter_type
+        self.window_size = window_size
+        self.alpha = alpha
+        self.process_noise = process_noise
+        self.measurement_noise = measurement_noise
+        self.max_missed_scans = max_missed_scans
+        self.scan_number = 0
+        self.slots = {}
+        self.free_slots = list(range(capacity - 1, -1, -1))
+        self.buffer = np.zeros((capacity, window_size))
+        self.sample_count = np.zeros(capacity, dtype=int)
+        self.ema = np.zeros(capacity)
+        self.kalman_estimate = np.zeros(capacity)
+        self.kalman_variance = np.zeros(capacity)
+        self.last_seen = np.zeros(capacity, dtype=int)
+
+    def grow(self):
+        """Double the number of slots."""
+        capacity = len(self.sample_count)
+        self.free_slots = list(range(2 * capacity - 1, capacity - 1, -1))
+        self.buffer = np.concatenate([self.buffer, np.zeros_like(self.buffer)])
+        self.sample_count = np.concatenate([self.sample_count, np.zeros_like(self.sample_count)])
+        self.ema = np.concatenate([self.ema, np.zeros_like(self.ema)])
+        self.kalman_estimate = np.concatenate([self.kalman_estimate, np.zeros_like(self.kalman_estimate)])
+        self.kalman_variance = np.concatenate([self.kalman_variance, np.zeros_like(self.kalman_variance)])
+        self.last_seen = np.concatenate([self.last_seen, np.zeros_like(self.last_seen)])
+
+    def get_slot(self, bssid):
+        """Return the slot of a BSSID, allocating an empty one for a new BSSID."""
+        slot = self.slots.get(bssid)
+        if slot is None:
+            if not self.free_slots:
+                self.grow()
+            slot = self.free_slots.pop()
+            self.buffer[slot] = 0
+            self.sample_count[slot] = 0
+            self.slots[bssid] = slot
+        return slot
+
+    def evict(self):
+        """Free the slots of BSSIDs not seen for more than `max_missed_scans` scans."""
+        stale = [bssid for bssid, slot in self.slots.items() if self.scan_number - self.last_seen[slot] > self.max_missed_scans]
+        for bssid in stale:
+            self.free_slots.append(self.slots.pop(bssid))
+
+    def update(self, real_time_networks):
+        """Add a scan to the state and return its networks with filtered RSS."""
+        self.scan_number += 1
+        networks = list({network["bssid"]: network for network in real_time_networks}.values())
+        slots = np.array([self.get_slot(network["bssid"]) for network in networks], dtype=int)
+        rss = np.array([network["rss"] for network in networks], dtype=float)
+
+        first = self.sample_count[slots] == 0
+        self.buffer[slots, self.sample_count[slots] % self.window_size] = rss
+        self.sample_count[slots] += 1
+        self.ema[slots] = np.where(first, rss, self.alpha * rss + (1 - self.alpha) * self.ema[slots])
+        self.last_seen[slots] = self.scan_number
+
+        # Random-walk Kalman filter, started from the first sample of each BSSID
+        predicted_variance = self.kalman_variance[slots] + self.process_noise
+        gain = np.where(first, 1.0, predicted_variance / (predicted_variance + self.measurement_noise))
+        self.kalman_estimate[slots] += gain * (rss - self.kalman_estimate[slots])
+        self.kalman_variance[slots] = np.where(first, self.measurement_noise, (1 - gain) * predicted_variance)
+
+        if self.filter_type == FilterType.MOVING_AVERAGE:
+            filled = np.minimum(self.sample_count[slots], self.window_size)
+            filtered_rss = self.buffer[slots].sum(axis=1) / filled
+        elif self.filter_type == FilterType.KALMAN:
+            filtered_rss = self.kalman_estimate[slots]
+        else:
+            filtered_rss = self.ema[slots]
+
+        self.evict()
+        return [dict(network, rss=value) for network, value in zip(networks, filtered_rss.tolist())]
+
+def filter_real_time_networks(real_time_networks, filter_type, filter_state=None):
+    """
+    Filter the real-time networks based on the specified filter type.
+    Without a `filter_state` only the current scan is known, so filtering has no effect.
+    """
     if filter_type == FilterType.NONE:
         return real_time_networks
-    elif filter_type == FilterType.MOVING_AVERAGE:
-        for network in real_time_networks:
-            network["rss"] = moving_average_filter([network["rss"]], MOVING_AVERAGE_WINDOW)[-1]
-        return real_time_networks
-    elif filter_type == FilterType.EXPONENTIAL:
-        for network in real_time_networks:
-            network["rss"] = exponential_filter([network["rss"]], EXP_FILTER_ALPHA)[-1]
+    elif filter_type in (FilterType.MOVING_AVERAGE, FilterType.EXPONENTIAL, FilterType.KALMAN):
+        if filter_state is not None:
+            return filter_state.update(real_time_networks)
         return real_time_networks
     else:
         raise ValueError("Invalid prediction filter type.")
 
-def predict_location(structured_fingerprints, filter_type, k=3, use_aggregation=False):
-    """Predict the location based on real-time networks."""
-    real_time_networks = filter_real_time_networks(get_networks(), filter_type)
-    x, y, floor = find_location(structured_fingerprints, real_time_networks, k, use_aggregation)
+def predict_location(radio_map, filter_type, k=3, use_aggregation=False, filter_state=None, scanner=None):
+    """Predict the location based on real-time networks, the next scan of `scanner` if one is running."""
+    _, networks = get_timestamped_networks(scanner)
+    real_time_networks = filter_real_time_networks(networks, filter_type, filter_state)
+    x, y, floor = find_location(radio_map, real_time_networks, k, use_aggregation)
     return x, y, floor
 
-def init_prediction():
-    """Initialize the prediction process."""
-    fingerprints = get_fingerprints_from_db(use_aggregation=USE_AGGREGATION)
+def prepare_radio_map(radio_map, db_file_path=None):
+    """Attach the configured index and clusters to a fingerprint matrix of the given database."""
+    if INDEX == IndexType.KD_TREE:
+        build_index(radio_map)
+    if USE_CLUSTERING:
+        build_clusters(radio_map, get_location_clusters_from_db(db_file_path))
+    if MATCHING == MatchingType.GAUSSIAN:
+        if "variance" in radio_map:
+            attach_variance_matrices(radio_map, radio_map["variance"])  # Stored by `radio_map_file.py`
+        else:
+            build_variance_matrices(radio_map, get_variances_from_db(db_file_path))
+    return radio_map
+
+def build_radio_map(structured_fingerprints, db_file_path=None):
+    """Build the radio map used for matching, with the configured index."""
+    return prepare_radio_map(build_fingerprint_matrix(structured_fingerprints), db_file_path)
+
+def load_virtual_grid(filename=VIRTUAL_GRID_FILE_PATH):
+    """Load the virtual radio map built by `grid.py`."""
+    with np.load(filename) as data:
+        return {
+            "bssid_index": {bssid: column for column, bssid in enumerate(data["bssids"].tolist())},
+            "rss": data["rss"],
+            "location_id": data["location_id"],
+            "x": data["x"],
+            "y": data["y"],
+            "floor": data["floor"],
+        }
+
+def prepare_virtual_grid(radio_map):
+    """Attach the configured index to a virtual radio map, which has no clusters or variances."""
+    if INDEX == IndexType.KD_TREE:
+        build_index(radio_map)
+    return radio_map
+
+def build_radio_map_for_file():
+    """Build the radio map stored by `radio_map_file.py`: the virtual grid, or the fingerprints with their variances."""
+    if USE_VIRTUAL_GRID:
+        return load_virtual_grid()
+    radio_map = build_fingerprint_matrix(structure_data(get_fingerprints_from_db(use_aggregation=USE_AGGREGATION)))
+    if USE_AGGREGATION:
+        radio_map["variance"] = build_variance_matrix(radio_map, get_variances_from_db())
+    return radio_map
+
+def init_prediction(db_file_path=None):
+    """
+    Initialize the prediction process. The radio map file and the virtual grid belong to the configured database,
+    so the radio map of another `db_file_path` is always built from its fingerprints.
+    """
+    if USE_RADIO_MAP_FILE and db_file_path is None:
+        radio_map = load_radio_map_file()
+        return prepare_virtual_grid(radio_map) if USE_VIRTUAL_GRID else prepare_radio_map(radio_map)
+
+    if USE_VIRTUAL_GRID and db_file_path is None:
+        return prepare_virtual_grid(load_virtual_grid())
+
+    fingerprints = get_fingerprints_from_db(use_aggregation=USE_AGGREGATION, db_file_path=db_file_path)
     structured_fingerprints = structure_data(fingerprints)
-    return structured_fingerprints
+    return build_radio_map(structured_fingerprints, db_file_path)
+
+class RadioMapReloader:
+    """
+    Keep the radio map of a long-running predictor in sync with the database.
+    `refresh()` is cheap when nothing changed; otherwise it reloads only the changed locations
+    and swaps a new radio map into `radio_map`, so a map in use is never modified.
+    """
+
+    def __init__(self, db_file_path=None):
+        self.db_file_path = db_file_path
+        self.map_file_mtime = self.get_map_file_mtime()
+        if self.map_file_mtime is None:
+            self.conn = connect(db_file_path, check_same_thread=False)
+            self.data_version = self.get_data_version()
+            self.checksums = self.get_location_checksums()
+        else:
+            self.conn = None  # Reloads follow the file, so the database is not watched
+        self.radio_map = init_prediction(db_file_path)
+
+    def get_map_file_mtime(self):
+        """
+        Return the modification time of the file the radio map is loaded from, which is rebuilt by
+        `radio_map_file.py` or `grid.py` rather than the database, or None if it is read from the database.
+        """
+        if self.db_file_path is not None:
+            return None
+        if USE_RADIO_MAP_FILE:
+            return os.path.getmtime(RADIO_MAP_FILE_PATH)
+        if USE_VIRTUAL_GRID:
+            return os.path.getmtime(VIRTUAL_GRID_FILE_PATH)
+        return None
+
+    def get_data_version(self):
+        """Return a value that changes whenever another connection commits to the database."""
+        return self.conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def get_location_checksums(self):
+        """Summarize the fingerprint of every location, with the variances the Gaussian matching uses, to find the ones that changed."""
+        if not USE_AGGREGATION:
+            return {}
+        cursor = self.conn.execute("""
+            SELECT l.id, l.x, l.y, l.floor, COUNT(*), TOTAL(f.agg_rss), TOTAL(f.ssid_id * f.agg_rss),
+                TOTAL(f.variance), TOTAL(f.ssid_id * f.variance), TOTAL(f.sample_num)
+            FROM filtered_wifi_signals f
+            JOIN locations l ON f.location_id = l.id
+            GROUP BY l.id
+        """)
+        return {row[0]: row[1:] for row in cursor}
+
+    def refresh(self):
+        """Reload the radio map if the database changed. Return True if a new radio map was swapped in."""
+        if self.map_file_mtime is not None:
+            map_file_mtime = self.get_map_file_mtime()
+            if map_file_mtime == self.map_file_mtime:
+                return False
+            self.map_file_mtime = map_file_mtime
+            self.radio_map = init_prediction(self.db_file_path)
+            return True
+
+        data_version = self.get_data_version()
+        if data_version == self.data_version:
+            return False
+        self.data_version = data_version
+
+        if not USE_AGGREGATION:
+            self.radio_map = init_prediction(self.db_file_path)
+            return True
+
+        checksums = self.get_location_checksums()
+        changed_ids = [location_id for location_id, checksum in checksums.items() if self.checksums.get(location_id) != checksum]
+        removed_ids = [location_id for location_id in self.checksums if location_id not in checksums]
+        self.checksums = checksums
+        if not changed_ids and not removed_ids and not USE_CLUSTERING:
+            return False
+
+        changed_fingerprints = structure_data(get_fingerprints_from_db(use_aggregation=True, location_ids=changed_ids, db_file_path=self.db_file_path)) if changed_ids else []
+        radio_map = update_fingerprint_matrix(self.radio_map, changed_fingerprints, removed_ids)
+        self.radio_map = prepare_radio_map(radio_map, self.db_file_path)
+        return True
 
 if __name__ == "__main__":
-    structured_fingerprints = init_prediction()
-    save_structured_fingerprints_to_file(structured_fingerprints)  # Save the structured data to a file
+    if not USE_RADIO_MAP_FILE:
+        structured_fingerprints = structure_data(get_fingerprints_from_db(use_aggregation=USE_AGGREGATION))
+        save_structured_fingerprints_to_file(structured_fingerprints)  # Save the structured data to a file
+    reloader = RadioMapReloader()
+    filter_state = RssFilterState(FILTER)
+    scanner = BackgroundScanner().start()
 
     while True:
         try:
-            x, y, floor = predict_location(structured_fingerprints, filter_type=FILTER, k=K, use_aggregation=USE_AGGREGATION)
+            if reloader.refresh():
+                print("Radio map reloaded.")
+            x, y, floor = predict_location(reloader.radio_map, filter_type=FILTER, k=K, use_aggregation=USE_AGGREGATION, filter_state=filter_state, scanner=scanner)
             if x is not None and y is not None:
                 now = time.strftime("%H:%M:%S")
                 print(f"{now}: Predicted location: x={x:.2f}, y={y:.2f}, floor={floor}")
             else:
                 print("No location found.")
-            time.sleep(1)
         except KeyboardInterrupt:
+            scanner.stop()
             print("\nCancelled.")
             break
\ No newline at end of file
@@ -0,0 +1,102 @@
+import os
+import json
+import struct
+import hashlib
+import numpy as np
+from config import RADIO_MAP_FILE_PATH
+
+# File layout: MAGIC, version and header length as little-endian uint32, a JSON header,
+# then every array at an ALIGNMENT-byte offset so it can be memory-mapped in place.
+MAGIC = b"WPSRMAP\n"
+VERSION = 1
+ALIGNMENT = 64
+ARRAY_DTYPES = {
+    "rss": "<f4",
+    "location_id": "<i4",
+    "x": "<f8",
+    "y": "<f8",
+    "floor": "<i4",
+    "variance": "<f4",  # Optional; clamped and filled like `build_variance_matrices`
+}
+
+def align(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+def content_hash(bssids, arrays):
+    """Hash the BSSIDs and array contents, so two files with the same radio map have the same hash."""
+    digest = hashlib.sha256()
+    digest.update("\n".join(bssids).encode())
+    for name, array in arrays.items():
+        digest.update(name.encode())
+        digest.update(str(array.shape).encode())
+        digest.update(np.ascontiguousarray(array).tobytes())
+    return digest.hexdigest()
+
+def save_radio_map_file(radio_map, filename=RADIO_MAP_FILE_PATH):
+    """
+    Write the radio map to a binary file that `load_radio_map_file` can memory-map.
+    The file is written next to the old one and swapped in, so processes that mapped the old file keep their pages.
+    """
+    bssids = sorted(radio_map["bssid_index"], key=radio_map["bssid_index"].get)
+    arrays = {}
+    for name, dtype in ARRAY_DTYPES.items():
+        if name in radio_map:
+            arrays[name] = np.ascontiguousarray(radio_map[name], dtype=dtype)
+
+    layout = {}
+    offset = 0
+    for name, array in arrays.items():
+        layout[name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+        offset = align(offset + array.nbytes)
+    header = json.dumps({"bssids": bssids, "arrays": layout, "content_hash": content_hash(bssids, arrays)}).encode()
+    data_start = align(len(MAGIC) + 8 + len(header))
+
+    temp_filename = f"{filename}.tmp"
+    with open(temp_filename, "wb") as file:
+        file.write(MAGIC + struct.pack("<II", VERSION, len(header)) + header)
+        for name, array in arrays.items():
+            file.seek(data_start + layout[name]["offset"])
+            file.write(array.tobytes())
+        file.truncate(data_start + offset)
+    os.replace(temp_filename, filename)
+    return layout
+
+def read_header(filename):
+    """Return the JSON header of a radio map file and the offset of its first array."""
+    with open(filename, "rb") as file:
+        magic = file.read(len(MAGIC))
+        if magic != MAGIC:
+            raise ValueError(f"{filename} is not a radio map file")
+        version, header_length = struct.unpack("<II", file.read(8))
+        if version != VERSION:
+            raise ValueError(f"{filename} has version {version}, expected {VERSION}; rebuild it")
+        header = json.loads(file.read(header_length))
+    return header, align(len(MAGIC) + 8 + header_length)
+
+def load_radio_map_file(filename=RADIO_MAP_FILE_PATH, verify=False):
+    """
+    Memory-map a radio map file. The arrays are read-only views of the file, so loading costs no copying
+    and every process that maps the same file shares its pages. `verify` rehashes the contents.
+    """
+    header, data_start = read_header(filename)
+    data = np.memmap(filename, dtype=np.uint8, mode="r")
+    radio_map = {"bssid_index": {bssid: column for column, bssid in enumerate(header["bssids"])}}
+    for name, info in header["arrays"].items():
+        dtype = np.dtype(info["dtype"])
+        start = data_start + info["offset"]
+        count = int(np.prod(info["shape"]))
+        radio_map[name] = data[start:start + count * dtype.itemsize].view(dtype).reshape(info["shape"])
+
+    radio_map["content_hash"] = header["content_hash"]
+    if verify:
+        arrays = {name: radio_map[name] for name in header["arrays"]}
+        if content_hash(header["bssids"], arrays) != header["content_hash"]:
+            raise ValueError(f"{filename} is corrupted; rebuild it")
+    return radio_map
+
+if __name__ == "__main__":
+    from predict import build_radio_map_for_file
+
+    radio_map = build_radio_map_for_file()
+    save_radio_map_file(radio_map)
+    print(f"{len(radio_map['x'])} locations x {len(radio_map['bssid_index'])} BSSIDs have been stored in {RADIO_MAP_FILE_PATH}.")
@@ -0,0 +1,98 @@
+import json
+import time
+from datetime import datetime
+from db import get_connection
+from model import wifi_signals_source, has_packed_scans
+from config import RSS_FOR_UNREACHABLE, SCANS_FOR_FINGERPRINT, REPLAY_SOURCE, REPLAY_SESSION_ID, REPLAY_SPEED, REPLAY_LOOP, REPLAY_MAX_GAP
+
+def load_scans_from_db(db_file_path=None, session_id=None):
+    """Return the stored scans, of one session or all of them, as (timestamp, networks) in the order they were taken."""
+    conn = get_connection(db_file_path)
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        SELECT w.scan_id, sc.scan_time, s.ssid, s.bssid, w.rss
+        FROM {wifi_signals_source(True, has_packed_scans(conn))} w
+        JOIN scans sc ON w.scan_id = sc.id
+        JOIN ssids s ON w.ssid_id = s.id
+        WHERE (? IS NULL OR sc.session_id = ?) AND w.rss != ?
+        ORDER BY w.scan_id
+    """, (session_id, session_id, RSS_FOR_UNREACHABLE))
+
+    scans = []
+    last_scan_id = None
+    for scan_id, scan_time, ssid, bssid, rss in cursor:
+        if scan_id != last_scan_id:
+            last_scan_id = scan_id
+            scans.append((datetime.strptime(scan_time, "%Y-%m-%d %H:%M:%S").timestamp(), []))
+        scans[-1][1].append({"ssid": ssid, "bssid": bssid, "rss": rss})
+    return scans
+
+def save_scan_log(filename, scans):
+    """Write (timestamp, networks) scans to a JSON Lines log, one scan per line."""
+    with open(filename, "w") as file:
+        for timestamp, networks in scans:
+            file.write(json.dumps({"time": timestamp, "networks": networks}) + "\n")
+
+def load_scan_log(filename):
+    """Read the (timestamp, networks) scans of a log written by `save_scan_log`."""
+    with open(filename) as file:
+        return [(scan["time"], scan["networks"]) for scan in map(json.loads, file) if scan]
+
+def load_scans(source=REPLAY_SOURCE, session_id=REPLAY_SESSION_ID):
+    """Load the scans of a `.jsonl` log, or of a database otherwise."""
+    if str(source).endswith(".jsonl"):
+        return load_scan_log(source)
+    return load_scans_from_db(source, session_id)
+
+class ScanReplayer:
+    """
+    Serve recorded scans one call at a time, as a live scan would return them.
+    The gaps between the recorded scans, capped at `max_gap` seconds, are kept at `speed` times real time;
+    a speed of 0 replays as fast as the scans are asked for. At the end it starts over, or returns no networks without `loop`.
+    """
+
+    def __init__(self, scans, speed=REPLAY_SPEED, loop=REPLAY_LOOP, max_gap=REPLAY_MAX_GAP):
+        self.scans = scans
+        self.speed = speed
+        self.loop = loop
+        self.max_gap = max_gap
+        self.position = 0
+        self.due_time = None  # time.monotonic() at which the next scan is taken
+
+    def done(self):
+        return not self.scans or (self.position == len(self.scans) and not self.loop)
+
+    def next_scan(self):
+        """Return the networks of the next recorded scan, after waiting for its turn."""
+        if self.done():
+            return []
+        if self.position == len(self.scans):
+            self.position = 0
+        timestamp, networks = self.scans[self.position]
+        self.position += 1
+
+        if self.speed > 0:
+            now = time.monotonic()
+            if self.due_time is not None and self.due_time > now:
+                time.sleep(self.due_time - now)
+            next_timestamp = self.scans[self.position % len(self.scans)][0]
+            gap = min(max(next_timestamp - timestamp, 0), self.max_gap) / self.speed
+            self.due_time = max(self.due_time or now, now) + gap
+        return [dict(network) for network in networks]
+
+if __name__ == "__main__":
+    from network import BackgroundScanner
+
+    # Record live scans to a log that SCAN_BACKEND = ScanBackend.REPLAY can play back
+    filename = datetime.now().strftime("scans_%Y%m%d_%H%M%S.jsonl")
+    scans = []
+    with BackgroundScanner(drop_oldest=False) as scanner:
+        try:
+            for i in range(SCANS_FOR_FINGERPRINT):
+                scans.append(scanner.get())
+                print(f"\r{i + 1}/{SCANS_FOR_FINGERPRINT} scans recorded", end='', flush=True)
+            print()
+        except KeyboardInterrupt:
+            print("\nStopped.")
+    save_scan_log(filename, scans)
+    print(f"{len(scans)} scans saved to {filename}")
@@ -0,0 +1,109 @@
+import os
+import time
+from db import connect
+from predict import RadioMapReloader, RssFilterState, filter_real_time_networks, find_location
+from network import BackgroundScanner
+from config import SITE_DB_FILE_PATHS, SITE_MIN_MATCHED_BSSIDS, FILTER, K, USE_AGGREGATION
+
+class SiteRegistry:
+    """
+    Serve the radio maps of several sites from one process. Every site keeps its own reloader, so its model
+    is built once and kept in sync with its database, and a scan is matched at the site whose BSSIDs it hears.
+    """
+
+    def __init__(self, db_file_paths=SITE_DB_FILE_PATHS, min_matched_bssids=SITE_MIN_MATCHED_BSSIDS):
+        self.db_file_paths = {site: path for site, path in db_file_paths.items() if os.path.exists(path)}
+        self.min_matched_bssids = min_matched_bssids
+        self.reloaders = {site: RadioMapReloader(path) for site, path in self.db_file_paths.items()}
+        self.build_bssid_sites()
+
+    def build_bssid_sites(self):
+        """Map every BSSID to the sites whose radio map has it."""
+        self.bssid_sites = {}
+        for site, reloader in self.reloaders.items():
+            for bssid in reloader.radio_map["bssid_index"]:
+                self.bssid_sites.setdefault(bssid, []).append(site)
+
+    def refresh(self):
+        """Reload the radio maps of the sites whose database changed. Return True if any was swapped in."""
+        refreshed = [reloader.refresh() for reloader in self.reloaders.values()]
+        if any(refreshed):
+            self.build_bssid_sites()
+        return any(refreshed)
+
+    def get_radio_map(self, site):
+        return self.reloaders[site].radio_map
+
+    def find_site(self, real_time_networks):
+        """Return the site with the most BSSIDs heard in the scan, the stronger ones on ties, or None if none has enough."""
+        matches = {}
+        for network in real_time_networks:
+            for site in self.bssid_sites.get(network["bssid"], ()):
+                count, total_rss = matches.get(site, (0, 0))
+                matches[site] = (count + 1, total_rss + network["rss"])
+        if not matches:
+            return None
+        site, (count, total_rss) = max(matches.items(), key=lambda item: item[1])
+        return site if count >= self.min_matched_bssids else None
+
+    def find_location(self, real_time_networks, k=K, use_aggregation=True):
+        """Find the site of the scan and the location in it. Returns (site, x, y, floor), all None if no site matched."""
+        site = self.find_site(real_time_networks)
+        if site is None:
+            return None, None, None, None
+        x, y, floor = find_location(self.get_radio_map(site), real_time_networks, k, use_aggregation)
+        return site, x, y, floor
+
+    def attach_sites(self):
+        """Return a connection with the database of every site attached under the name of the site, for queries across sites."""
+        conn = connect(":memory:")
+        for site, path in self.db_file_paths.items():
+            conn.execute(f'ATTACH DATABASE ? AS "{site.value}"', (path,))
+        return conn
+
+    def get_site_summary(self):
+        """Count the locations, tracked SSIDs and scans of every site with a single query over the attached databases."""
+        conn = self.attach_sites()
+        query = " UNION ALL ".join(f"""
+            SELECT '{site.value}',
+                (SELECT COUNT(*) FROM "{site.value}".locations),
+                (SELECT COUNT(*) FROM "{site.value}".ssids),
+                (SELECT COUNT(*) FROM "{site.value}".scans)
+        """ for site in self.db_file_paths)
+        summary = conn.execute(query).fetchall() if query else []
+        conn.close()
+        return summary
+
+    def get_shared_bssids(self):
+        """Return the BSSIDs tracked at more than one site, with those sites, since they make site detection ambiguous."""
+        conn = self.attach_sites()
+        query = " UNION ALL ".join(f"""SELECT bssid, '{site.value}' AS site FROM "{site.value}".ssids""" for site in self.db_file_paths)
+        shared = conn.execute(f"""
+            SELECT bssid, GROUP_CONCAT(site) FROM ({query})
+            GROUP BY bssid HAVING COUNT(*) > 1
+        """).fetchall() if query else []
+        conn.close()
+        return shared
+
+if __name__ == "__main__":
+    registry = SiteRegistry()
+    for site, location_count, ssid_count, scan_count in registry.get_site_summary():
+        print(f"{site}: {location_count} locations, {ssid_count} SSIDs, {scan_count} scans")
+    filter_state = RssFilterState(FILTER)
+    scanner = BackgroundScanner().start()
+
+    while True:
+        try:
+            if registry.refresh():
+                print("Radio maps reloaded.")
+            real_time_networks = filter_real_time_networks(scanner.get()[1], FILTER, filter_state)
+            site, x, y, floor = registry.find_location(real_time_networks, k=K, use_aggregation=USE_AGGREGATION)
+            now = time.strftime("%H:%M:%S")
+            if x is not None and y is not None:
+                print(f"{now}: Predicted location: site={site.value}, x={x:.2f}, y={y:.2f}, floor={floor}")
+            else:
+                print(f"{now}: No location found.")
+        except KeyboardInterrupt:
+            scanner.stop()
+            print("\nCancelled.")
+            break
@@ -0,0 +1,154 @@
+import time
+import numpy as np
+from scipy.spatial import cKDTree
+from network import get_timestamped_networks
+from predict import calculate_distances, filter_real_time_networks, find_location
+from config import K, POSITION_PROCESS_NOISE, POSITION_MEASUREMENT_NOISE, PARTICLE_COUNT, PARTICLE_MOTION_STD, PARTICLE_RSS_STD
+
+class PositionKalmanTracker:
+    """
+    Constant-velocity Kalman filter on the (x, y) output of `find_location`.
+    The state is (x, y, vx, vy); it restarts whenever the floor changes.
+    """
+
+    def __init__(self, process_noise=POSITION_PROCESS_NOISE, measurement_noise=POSITION_MEASUREMENT_NOISE):
+        self.process_noise = process_noise
+        self.measurement_noise = measurement_noise
+        self.observation = np.array([[1.0, 0, 0, 0], [0, 1.0, 0, 0]])
+        self.reset()
+
+    def reset(self):
+        self.state = None
+        self.covariance = None
+        self.floor = None
+        self.last_time = None
+
+    def update(self, x, y, floor, timestamp=None):
+        """Add a position estimate and return the tracked position; a missing estimate returns the last one."""
+        if x is None or y is None:
+            if self.state is None:
+                return None, None, None
+            return self.state[0], self.state[1], self.floor
+
+        now = time.monotonic() if timestamp is None else timestamp
+        measurement = np.array([x, y], dtype=float)
+        if self.state is None or floor != self.floor:
+            self.state = np.array([x, y, 0.0, 0.0])
+            self.covariance = np.diag([self.measurement_noise ** 2] * 2 + [1.0] * 2)
+            self.floor = floor
+            self.last_time = now
+            return x, y, floor
+
+        dt = max(now - self.last_time, 1e-3)
+        self.last_time = now
+        transition = np.eye(4)
+        transition[0, 2] = transition[1, 3] = dt
+        axis_noise = np.array([[dt ** 4 / 4, dt ** 3 / 2], [dt ** 3 / 2, dt ** 2]]) * self.process_noise ** 2
+        process_covariance = np.kron(axis_noise, np.eye(2))
+
+        # Predict
+        self.state = transition @ self.state
+        self.covariance = transition @ self.covariance @ transition.T + process_covariance
+
+        # Correct
+        innovation = measurement - self.observation @ self.state
+        innovation_covariance = self.observation @ self.covariance @ self.observation.T + np.eye(2) * self.measurement_noise ** 2
+        gain = self.covariance @ self.observation.T @ np.linalg.inv(innovation_covariance)
+        self.state = self.state + gain @ innovation
+        self.covariance = (np.eye(4) - gain @ self.observation) @ self.covariance
+
+        return self.state[0], self.state[1], self.floor
+
+class ParticleFilterTracker:
+    """
+    Particle filter over (x, y) positions on the floor that best matches the scans.
+    Particles move by a random walk and are weighted by the Gaussian likelihood of the scan
+    at their nearest reference location, so one update costs one distance computation over the radio map.
+    """
+
+    def __init__(self, particle_count=PARTICLE_COUNT, motion_std=PARTICLE_MOTION_STD, rss_std=PARTICLE_RSS_STD, seed=None):
+        self.particle_count = particle_count
+        self.motion_std = motion_std
+        self.rss_std = rss_std
+        self.rng = np.random.default_rng(seed)
+        self.radio_map = None
+        self.reset()
+
+    def reset(self):
+        self.particles = None
+        self.weights = None
+        self.floor = None
+        self.last_time = None
+
+    def set_radio_map(self, radio_map):
+        """Index the reference locations of every floor by position."""
+        self.radio_map = radio_map
+        self.floor_rows = {}
+        self.floor_trees = {}
+        for floor in np.unique(radio_map["floor"]).tolist():
+            rows = np.flatnonzero(radio_map["floor"] == floor)
+            self.floor_rows[floor] = rows
+            self.floor_trees[floor] = cKDTree(np.column_stack([radio_map["x"][rows], radio_map["y"][rows]]))
+
+    def estimate(self):
+        if self.particles is None:
+            return None, None, None
+        x, y = self.weights @ self.particles
+        return x, y, self.floor
+
+    def initialize(self, floor, log_likelihood):
+        """Spread the particles around the reference locations of the floor in proportion to their likelihood."""
+        rows = self.floor_rows[floor]
+        probabilities = np.exp(log_likelihood[rows] - log_likelihood[rows].max())
+        chosen = rows[self.rng.choice(len(rows), self.particle_count, p=probabilities / probabilities.sum())]
+        self.particles = np.column_stack([self.radio_map["x"][chosen], self.radio_map["y"][chosen]])
+        self.particles += self.rng.normal(0, self.motion_std, self.particles.shape)
+        self.weights = np.full(self.particle_count, 1 / self.particle_count)
+        self.floor = floor
+
+    def resample(self):
+        """Systematic resampling."""
+        positions = (self.rng.random() + np.arange(self.particle_count)) / self.particle_count
+        chosen = np.minimum(np.searchsorted(np.cumsum(self.weights), positions), self.particle_count - 1)
+        self.particles = self.particles[chosen]
+        self.weights = np.full(self.particle_count, 1 / self.particle_count)
+
+    def update(self, radio_map, real_time_networks, timestamp=None):
+        """Add a scan and return the tracked position; a scan with no networks returns the last estimate."""
+        if radio_map is not self.radio_map:
+            self.set_radio_map(radio_map)
+        if not real_time_networks or len(radio_map["location_id"]) == 0:
+            return self.estimate()
+
+        now = time.monotonic() if timestamp is None else timestamp
+        distances = calculate_distances(radio_map, real_time_networks)
+        log_likelihood = -0.5 * (distances / self.rss_std) ** 2
+        floor = radio_map["floor"][np.argmin(distances)].item()
+
+        self.last_time, last_time = now, self.last_time
+        if self.particles is None or floor != self.floor:
+            # The particles are drawn in proportion to this scan's likelihood already; weighting them by it again would count it twice
+            self.initialize(floor, log_likelihood)
+            return self.estimate()
+
+        dt = max(now - last_time, 1e-3)
+        self.particles += self.rng.normal(0, self.motion_std * np.sqrt(dt), self.particles.shape)
+
+        _, nearest = self.floor_trees[floor].query(self.particles)
+        particle_log_likelihood = log_likelihood[self.floor_rows[floor][nearest]]
+        self.weights = self.weights * np.exp(particle_log_likelihood - particle_log_likelihood.max())
+        self.weights /= self.weights.sum()
+
+        estimate = self.estimate()
+        if 1 / np.sum(self.weights ** 2) < self.particle_count / 2:
+            self.resample()
+        return estimate
+
+def track_location(radio_map, tracker, filter_type, k=K, use_aggregation=False, filter_state=None, scanner=None):
+    """Predict the location from real-time networks and pass it through the tracker, timed by when the scan was taken."""
+    timestamp, networks = get_timestamped_networks(scanner)
+    real_time_networks = filter_real_time_networks(networks, filter_type, filter_state)
+    if isinstance(tracker, ParticleFilterTracker):
+        return tracker.update(radio_map, real_time_networks, timestamp)
+    x, y, floor = find_location(radio_map, real_time_networks, k, use_aggregation)
+    return tracker.update(x, y, floor, timestamp)
@@ -1,11 +1,21 @@
 import socket
 import time
 import numpy as np
-from predict import init_prediction, predict_location
-from config import FILTER, K, USE_AGGREGATION
+from network import BackgroundScanner
+from predict import RadioMapReloader, RssFilterState, predict_location
+from tracking import ParticleFilterTracker, PositionKalmanTracker, track_location
+from config import FILTER, K, USE_AGGREGATION, TRACKING, TrackingType
 
 # Initialize prediction
-structured_fingerprints = init_prediction()
+reloader = RadioMapReloader()
+filter_state = RssFilterState(FILTER)
+scanner = BackgroundScanner().start()
+if TRACKING == TrackingType.KALMAN:
+    tracker = PositionKalmanTracker()
+elif TRACKING == TrackingType.PARTICLE:
+    tracker = ParticleFilterTracker()
+else:
+    tracker = None
 
 # Socket configuration
 HOST = '10.100.40.251'  # Server hostname or IP address of the receiver
@@ -23,7 +33,11 @@ def send_location():
                 s.connect((HOST, PORT))
                 while True:
                     try:
-                        x, y, floor = predict_location(structured_fingerprints, filter_type=FILTER, k=K, use_aggregation=USE_AGGREGATION)
+                        reloader.refresh()
+                        if tracker is None:
+                            x, y, floor = predict_location(reloader.radio_map, filter_type=FILTER, k=K, use_aggregation=USE_AGGREGATION, filter_state=filter_state, scanner=scanner)
+                        else:
+                            x, y, floor = track_location(reloader.radio_map, tracker, filter_type=FILTER, k=K, use_aggregation=USE_AGGREGATION, filter_state=filter_state, scanner=scanner)
                         if x is not None and y is not None:
                             location_data = f"{x:.2f},{y:.2f},{floor}"
                             s.sendall(location_data.encode('utf-8'))
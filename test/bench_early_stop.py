@@ -0,0 +1,70 @@
+import os
+import sys
+import shutil
+import sqlite3
+import tempfile
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+import db
+from network import NetworkAggregator, is_stale_scan, scan_fingerprint
+from replay import load_scans_from_db
+from config import RSS_FOR_UNREACHABLE, MIN_SCANS_FOR_FINGERPRINT
+
+def drop_stale_scans(scans):
+    """The scans a BackgroundScanner would have queued: recorded surveys hold many repeats of the driver's cached result."""
+    fresh_scans = []
+    last_fingerprint = None
+    for timestamp, networks in scans:
+        if not is_stale_scan(networks, last_fingerprint):
+            fresh_scans.append((timestamp, networks))
+        last_fingerprint = scan_fingerprint(networks)
+    return fresh_scans
+
+def scans_needed(scans, tracked_bssids, min_scans=MIN_SCANS_FOR_FINGERPRINT):
+    """New scans after which an early-stopping session would have ended, or None if it would have run all its polls."""
+    aggregator = NetworkAggregator(missing_rss=RSS_FOR_UNREACHABLE)
+    for i, (_, networks) in enumerate(scans):
+        aggregator.add([network for network in networks if network["bssid"] in tracked_bssids])
+        if i + 1 >= min_scans and not aggregator.get_unsettled_bssids():
+            return i + 1
+    return None
+
+if __name__ == "__main__":
+    for name in ("robotics_wifi.db", "myhome_wifi.db"):
+        with tempfile.TemporaryDirectory() as directory:
+            db_file_path = os.path.join(directory, name)
+            shutil.copy(os.path.join(os.path.dirname(__file__), '..', name), db_file_path)
+            conn = sqlite3.connect(db_file_path)
+            sessions = conn.execute("SELECT id, location_id FROM scan_sessions ORDER BY id").fetchall()
+            tracked_bssids = {row[0] for row in conn.execute("SELECT bssid FROM ssids")}
+            conn.close()
+
+            # Times are of the recorded polls, from the first poll to the one the session would have stopped at
+            recorded = taken = 0
+            min_scans_options = sorted({3, 5, 10, 20, MIN_SCANS_FOR_FINGERPRINT})
+            needed = dict.fromkeys(min_scans_options, 0)
+            full_time = 0
+            stop_time = dict.fromkeys(min_scans_options, 0)
+            print(f"{name}: location, recorded scans, new scans, s -> scans needed, s for MIN_SCANS_FOR_FINGERPRINT of {min_scans_options}")
+            for session_id, location_id in sessions:
+                scans = load_scans_from_db(db_file_path, session_id)
+                fresh_scans = drop_stale_scans(scans)
+                recorded += len(scans)
+                taken += len(fresh_scans)
+                session_time = scans[-1][0] - scans[0][0]
+                full_time += session_time
+                results = []
+                for min_scans in min_scans_options:
+                    count = scans_needed(fresh_scans, tracked_bssids, min_scans)
+                    seconds = session_time if count is None else fresh_scans[count - 1][0] - scans[0][0]
+                    count = len(fresh_scans) if count is None else count
+                    needed[min_scans] += count
+                    stop_time[min_scans] += seconds
+                    results.append(f"{count:>4} {seconds:>4.0f}")
+                print(f"{location_id:>4} {len(scans):>4} {len(fresh_scans):>4} {session_time:>4.0f} -> {' | '.join(results)}")
+            print(f"total {recorded} recorded, {taken} new in {full_time / len(sessions):.0f} s per session")
+            for min_scans in min_scans_options:
+                print(f"  at least {min_scans:>2} new scans: {needed[min_scans]} scans needed, {stop_time[min_scans] / len(sessions):.0f} s per session")
+            print()
+            db.close_connections()
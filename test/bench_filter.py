@@ -0,0 +1,88 @@
+import os
+import sys
+import time
+import sqlite3
+import tempfile
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+import db
+import model
+import filter as rss_filter
+from config import FilterType, FilterBackend, AggregationType
+
+def create_database(db_file_path, location_count, ssid_count, scan_count, rng):
+    """Dense synthetic survey: one session of `scan_count` scans per location, every SSID in every scan."""
+    db.DB_FILE_PATH = db_file_path
+    model.initialize_database()
+    conn = sqlite3.connect(db_file_path)
+    conn.executemany("INSERT INTO locations (id, x, y, floor) VALUES (?, ?, ?, 0)", [(i, i % 50, i // 50) for i in range(1, location_count + 1)])
+    conn.executemany("INSERT INTO ssids (id, ssid, bssid) VALUES (?, '', ?)", [(i, f"ap{i}") for i in range(1, ssid_count + 1)])
+    conn.executemany("INSERT INTO scan_sessions (id, location_id) VALUES (?, ?)", [(i, i) for i in range(1, location_count + 1)])
+    scan_ids = np.arange(1, location_count * scan_count + 1)
+    conn.executemany("INSERT INTO scans (id, session_id) VALUES (?, ?)", zip(scan_ids.tolist(), ((scan_ids - 1) // scan_count + 1).tolist()))
+    for scan_id in scan_ids.tolist():
+        rss = rng.integers(-95, -30, ssid_count).tolist()
+        conn.executemany("INSERT INTO wifi_signals (scan_id, ssid_id, rss) VALUES (?, ?, ?)", zip([scan_id] * ssid_count, range(1, ssid_count + 1), rss))
+    conn.commit()
+    conn.close()
+
+def time_filter(**kwargs):
+    start = time.perf_counter()
+    rss_filter.filter_rss(incremental=False, **kwargs)
+    return time.perf_counter() - start
+
+def load_signals():
+    """All signals as a (location_id, ssid_id, rss, scan_id) array, to time the aggregation without SQLite."""
+    return np.array(db.get_connection().execute("""
+        SELECT ss.location_id, w.ssid_id, w.rss, w.scan_id
+        FROM wifi_signals w
+        JOIN scans sc ON w.scan_id = sc.id
+        JOIN scan_sessions ss ON sc.session_id = ss.id
+        ORDER BY ss.location_id, w.ssid_id, w.scan_id
+    """).fetchall(), dtype=float)
+
+def aggregate_python(signals):
+    starts = np.flatnonzero(np.r_[True, np.any(signals[1:, :2] != signals[:-1, :2], axis=1)])
+    return [rss_filter.filter_and_aggregate(group.tolist()) for group in np.split(signals[:, 2], starts[1:])]
+
+def fetch_filtered():
+    return db.get_connection().execute("SELECT location_id, ssid_id, agg_rss, sample_num, variance FROM filtered_wifi_signals ORDER BY location_id, ssid_id").fetchall()
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as directory:
+        create_database(os.path.join(directory, "bench.db"), 200, 50, 100, rng)
+        print(f"200 locations x 50 SSIDs x 100 scans = 1,000,000 signals, {os.cpu_count()} CPUs\n")
+        print(f"{'filter':>16} {'aggregation':>12} {'python s':>9} {'numpy s':>8} {'speedup':>8}")
+        for filter_type in (FilterType.MOVING_AVERAGE, FilterType.EXPONENTIAL, FilterType.KALMAN):
+            for aggregation in AggregationType:
+                rss_filter.FILTER = filter_type
+                rss_filter.AGGREGATION = aggregation
+                python_time = time_filter(backend=FilterBackend.PYTHON)
+                expected = fetch_filtered()
+                numpy_time = time_filter(backend=FilterBackend.NUMPY, workers=1)
+                assert np.allclose(np.array(fetch_filtered()), np.array(expected))
+                print(f"{filter_type.value:>16} {aggregation.value:>12} {python_time:>9.2f} {numpy_time:>8.2f} {python_time / numpy_time:>7.1f}x")
+
+        signals = load_signals()
+        print(f"\naggregation only, signals already in memory\n{'filter':>16} {'aggregation':>12} {'python s':>9} {'numpy s':>8} {'speedup':>8}")
+        for filter_type in (FilterType.MOVING_AVERAGE, FilterType.EXPONENTIAL, FilterType.KALMAN):
+            for aggregation in AggregationType:
+                rss_filter.FILTER = filter_type
+                rss_filter.AGGREGATION = aggregation
+                start = time.perf_counter()
+                aggregate_python(signals)
+                python_time = time.perf_counter() - start
+                start = time.perf_counter()
+                rss_filter.aggregate_block(signals, filter_type, rss_filter.MOVING_AVERAGE_WINDOW, rss_filter.EXP_FILTER_ALPHA,
+                                           rss_filter.KALMAN_PROCESS_NOISE, rss_filter.KALMAN_MEASUREMENT_NOISE, aggregation.value)
+                numpy_time = time.perf_counter() - start
+                print(f"{filter_type.value:>16} {aggregation.value:>12} {python_time:>9.2f} {numpy_time:>8.2f} {python_time / numpy_time:>7.1f}x")
+
+        rss_filter.FILTER = FilterType.EXPONENTIAL
+        rss_filter.AGGREGATION = AggregationType.MEDIAN
+        print(f"\n{'workers':>8} {'numpy s':>8}")
+        for workers in (1, 2, 4):
+            print(f"{workers:>8} {time_filter(backend=FilterBackend.NUMPY, workers=workers):>8.2f}")
@@ -0,0 +1,67 @@
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from predict import build_fingerprint_matrix, calculate_distance, find_location, predict_many
+
+def find_location_legacy(structured_fingerprints, real_time_networks, k=3):
+    """The per-location Python loop that `find_location` used before the fingerprint matrix."""
+    distances = []
+    for fingerprint in structured_fingerprints:
+        rss_values = [fingerprint.get(rt_network["bssid"], -100) for rt_network in real_time_networks]
+        rt_rss_values = [rt_network["rss"] for rt_network in real_time_networks]
+        distance = calculate_distance(rss_values, rt_rss_values)
+        distances.append((distance, fingerprint["location_id"], fingerprint["x"], fingerprint["y"], fingerprint["floor"]))
+
+    distances.sort(key=lambda x: x[0])
+    nearest_neighbors = distances[:k]
+    weight_sum = np.sum([1 / d[0] for d in nearest_neighbors if d[0] != 0])
+    x = np.sum([(1 / d[0]) * d[2] for d in nearest_neighbors if d[0] != 0]) / weight_sum
+    y = np.sum([(1 / d[0]) * d[3] for d in nearest_neighbors if d[0] != 0]) / weight_sum
+    return x, y, nearest_neighbors[0][4]
+
+def make_synthetic_map(location_count, bssid_count, rng):
+    """Random radio map in the structured fingerprint format."""
+    bssids = [f"00:00:00:{i // 256:02x}:{i % 256:02x}:00" for i in range(bssid_count)]
+    structured_fingerprints = []
+    for location_id in range(location_count):
+        row = {"location_id": location_id, "x": rng.uniform(0, 50), "y": rng.uniform(0, 50), "floor": 0}
+        row.update({bssid: int(rss) for bssid, rss in zip(bssids, rng.integers(-95, -30, bssid_count))})
+        structured_fingerprints.append(row)
+    return bssids, structured_fingerprints
+
+def make_synthetic_scan(bssids, network_count, rng):
+    return [{"ssid": "", "bssid": bssid, "rss": int(rng.integers(-95, -30))}
+            for bssid in rng.choice(bssids, network_count, replace=False)]
+
+def time_call(function, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = function()
+    return (time.perf_counter() - start) / repeat, result
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    print(f"{'locations':>10} {'legacy ms':>10} {'matrix ms':>10} {'speedup':>8}")
+    for location_count in (25, 1000, 5000):
+        bssids, structured_fingerprints = make_synthetic_map(location_count, 200, rng)
+        radio_map = build_fingerprint_matrix(structured_fingerprints)
+        scan = make_synthetic_scan(bssids, 40, rng)
+
+        legacy_time, legacy = time_call(lambda: find_location_legacy(structured_fingerprints, scan), 5)
+        matrix_time, matrix = time_call(lambda: find_location(radio_map, scan), 50)
+        assert np.allclose(legacy[:2], matrix[:2]) and legacy[2] == matrix[2]
+
+        print(f"{location_count:>10} {legacy_time * 1e3:>10.2f} {matrix_time * 1e3:>10.3f} {legacy_time / matrix_time:>7.0f}x")
+
+    print(f"\n{'scans':>10} {'loop s':>10} {'batch s':>10} {'speedup':>8}")
+    bssids, structured_fingerprints = make_synthetic_map(1000, 200, rng)
+    radio_map = build_fingerprint_matrix(structured_fingerprints)
+    for scan_count in (1000, 10000):
+        scans = [make_synthetic_scan(bssids, 40, rng) for _ in range(scan_count)]
+        loop_time, _ = time_call(lambda: [find_location(radio_map, scan) for scan in scans], 1)
+        batch_time, _ = time_call(lambda: predict_many(radio_map, scans), 1)
+        print(f"{scan_count:>10} {loop_time:>10.2f} {batch_time:>10.2f} {loop_time / batch_time:>7.1f}x")
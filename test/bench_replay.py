@@ -0,0 +1,39 @@
+import os
+import sys
+import time
+import shutil
+import tempfile
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+import db
+import network
+import predict
+from config import ScanBackend, FILTER, K, USE_AGGREGATION
+from replay import ScanReplayer, load_scans
+
+SCAN_COUNT = 2000
+
+def time_predict(radio_map, scanner=None):
+    filter_state = predict.RssFilterState(FILTER)
+    start = time.perf_counter()
+    for _ in range(SCAN_COUNT):
+        predict.predict_location(radio_map, FILTER, K, USE_AGGREGATION, filter_state, scanner)
+    return time.perf_counter() - start
+
+if __name__ == "__main__":
+    # End-to-end predict loop on recorded scans, replayed as fast as they are asked for
+    with tempfile.TemporaryDirectory() as directory:
+        db.DB_FILE_PATH = os.path.join(directory, "robotics_wifi.db")
+        shutil.copy(os.path.join(os.path.dirname(__file__), '..', 'robotics_wifi.db'), db.DB_FILE_PATH)
+        network.SCAN_BACKEND = ScanBackend.REPLAY
+        network.replayer = ScanReplayer(load_scans(db.DB_FILE_PATH), speed=0)
+        radio_map = predict.init_prediction()
+        print(f"{len(network.replayer.scans)} recorded scans, {len(radio_map['location_id'])} locations\n")
+
+        elapsed = time_predict(radio_map)
+        print(f"predict_location:                    {SCAN_COUNT / elapsed:8.0f} scans/s")
+        with network.BackgroundScanner(drop_oldest=False) as scanner:
+            elapsed = time_predict(radio_map, scanner)
+        print(f"predict_location, background scans:  {SCAN_COUNT / elapsed:8.0f} scans/s")
+        db.close_connections()
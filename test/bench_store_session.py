@@ -0,0 +1,85 @@
+import os
+import sys
+import time
+import sqlite3
+import tempfile
+import contextlib
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+import db
+import model
+import fingerprint
+from config import RSS_FOR_UNREACHABLE
+
+def store_session_to_db_legacy(db_file_path, location_id, session, session_time):
+    """The statement-per-row ingest that `store_session_to_db` used before bulk inserts."""
+    conn = sqlite3.connect(db_file_path)
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO scan_sessions (location_id, session_time) VALUES (?, ?)", (location_id, session_time))
+    session_id = cursor.lastrowid
+    cursor.execute("SELECT id, ssid, bssid FROM ssids")
+    all_ssids = cursor.fetchall()
+
+    for networks, scan_time in session:
+        cursor.execute("INSERT INTO scans (session_id, scan_time) VALUES (?, ?)", (session_id, scan_time))
+        scan_id = cursor.lastrowid
+        detected_ssids = set()
+        for network in networks:
+            cursor.execute("SELECT id FROM ssids WHERE bssid = ?", (network["bssid"],))
+            existing_ssid = cursor.fetchone()
+            if not existing_ssid:
+                continue
+            detected_ssids.add(existing_ssid[0])
+            cursor.execute("INSERT INTO wifi_signals (scan_id, ssid_id, rss) VALUES (?, ?, ?)", (scan_id, existing_ssid[0], network["rss"]))
+        for ssid_id, ssid, bssid in all_ssids:
+            if ssid_id not in detected_ssids:
+                cursor.execute("INSERT INTO wifi_signals (scan_id, ssid_id, rss) VALUES (?, ?, ?)", (scan_id, ssid_id, RSS_FOR_UNREACHABLE))
+
+    conn.commit()
+    conn.close()
+
+def create_database(db_file_path, bssids):
+    db.DB_FILE_PATH = db_file_path
+    model.initialize_database()
+    conn = sqlite3.connect(db_file_path)
+    conn.execute("INSERT INTO locations (x, y, floor, location_name) VALUES (0, 0, 0, 'bench')")
+    conn.executemany("INSERT INTO ssids (ssid, bssid) VALUES (?, ?)", [(f"ap{i}", bssid) for i, bssid in enumerate(bssids)])
+    conn.commit()
+    conn.close()
+
+def make_synthetic_session(bssids, scan_count, rng):
+    """Each scan hears a random 60% of the access points."""
+    session = []
+    for i in range(scan_count):
+        heard = rng.choice(bssids, int(len(bssids) * 0.6), replace=False)
+        networks = [{"ssid": "", "bssid": bssid, "rss": int(rng.integers(-90, -30))} for bssid in heard]
+        session.append([networks, f"2024-01-01 00:{i // 60:02d}:{i % 60:02d}"])
+    return session
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    bssids = [f"00:00:00:00:{i // 256:02x}:{i % 256:02x}" for i in range(500)]
+    session = make_synthetic_session(bssids, 100, rng)
+
+    with tempfile.TemporaryDirectory() as directory:
+        legacy_db = os.path.join(directory, "legacy.db")
+        bulk_db = os.path.join(directory, "bulk.db")
+        create_database(legacy_db, bssids)
+        create_database(bulk_db, bssids)
+
+        start = time.perf_counter()
+        store_session_to_db_legacy(legacy_db, 1, session, "2024-01-01 00:00:00")
+        legacy_time = time.perf_counter() - start
+
+        db.DB_FILE_PATH = bulk_db
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(open(os.devnull, "w")):
+            fingerprint.store_session_to_db(1, session, "2024-01-01 00:00:00")
+        bulk_time = time.perf_counter() - start
+
+        query = "SELECT scan_id, ssid_id, rss FROM wifi_signals ORDER BY id"
+        assert sqlite3.connect(legacy_db).execute(query).fetchall() == sqlite3.connect(bulk_db).execute(query).fetchall()
+
+    print(f"100 scans x 500 APs: legacy {legacy_time:.2f} s, bulk {bulk_time:.2f} s, speedup {legacy_time / bulk_time:.1f}x")
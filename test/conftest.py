@@ -0,0 +1,40 @@
+import os
+import sys
+import shutil
+import sqlite3
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+import db
+
+@pytest.fixture
+def copy_database(tmp_path, monkeypatch):
+    """Return a function copying a database of the repository into `tmp_path` and making the copy the default database."""
+    def copy(name="robotics_wifi.db"):
+        db_file_path = tmp_path / name
+        shutil.copy(os.path.join(os.path.dirname(__file__), '..', name), db_file_path)
+        monkeypatch.setattr(db, "DB_FILE_PATH", str(db_file_path))
+        return db_file_path
+    return copy
+
+@pytest.fixture
+def database(copy_database):
+    """Path of a copy of robotics_wifi.db, set as the default database."""
+    return copy_database()
+
+def read_filtered(db_file_path):
+    conn = sqlite3.connect(db_file_path)
+    rows = conn.execute("SELECT location_id, ssid_id, agg_rss, sample_num, variance FROM filtered_wifi_signals ORDER BY location_id, ssid_id").fetchall()
+    conn.close()
+    return rows
+
+@pytest.fixture
+def fetch_filtered():
+    """Return a function reading the filtered rows of a database in a stable order."""
+    return read_filtered
+
+@pytest.fixture
+def sort_networks():
+    """Return a function ordering the networks of a scan by BSSID, since stored scans do not keep their order."""
+    return lambda networks: sorted(networks, key=lambda network: network["bssid"])
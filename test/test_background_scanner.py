@@ -0,0 +1,78 @@
+import os
+import sys
+import time
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from network import BackgroundScanner
+
+def counting_scan():
+    count = 0
+    def scan():
+        nonlocal count
+        count += 1
+        return [{"ssid": "ap", "bssid": "00:00:00:00:00", "rss": -count}]
+    return scan
+
+def test_scans_are_delivered_in_order():
+    with BackgroundScanner(interval=0, queue_size=4, drop_oldest=False, scan=counting_scan()) as scanner:
+        results = [scanner.get(timeout=1) for _ in range(10)]
+    assert [networks[0]["rss"] for _, networks in results] == list(range(-1, -11, -1))
+    assert all(a[0] <= b[0] for a, b in zip(results, results[1:]))
+    assert not scanner.thread.is_alive()
+
+def test_slow_consumer_gets_the_newest_scans():
+    with BackgroundScanner(interval=0, queue_size=3, scan=counting_scan()) as scanner:
+        time.sleep(0.2)
+        results = scanner.get_all()
+    rss = [networks[0]["rss"] for _, networks in results]
+    assert 1 <= len(rss) <= 3
+    assert rss[-1] < -3 and rss == sorted(rss, reverse=True)
+
+def test_scanning_overlaps_the_consumer():
+    def slow_scan():
+        time.sleep(0.05)
+        return []
+    start = time.monotonic()
+    with BackgroundScanner(interval=0, drop_oldest=False, scan=slow_scan) as scanner:
+        for _ in range(6):
+            scanner.get(timeout=1)
+            time.sleep(0.05)  # Matching or storing the scan
+    assert time.monotonic() - start < 0.5  # 0.6 s if scanning and consuming took turns
+
+def test_stale_scans_are_skipped():
+    results = [[{"ssid": "ap", "bssid": "a", "rss": -50}]] * 3 + [[{"ssid": "ap", "bssid": "a", "rss": -51}]] + [[]] * 2
+    def cached_scan():
+        return results.pop(0) if results else [{"ssid": "ap", "bssid": "a", "rss": -52}]
+    scanner = BackgroundScanner(interval=0.01, drop_oldest=False, scan=cached_scan, min_interval=0.01, max_interval=0.05)
+    with scanner:
+        rss = [networks[0]["rss"] if networks else None for _, networks in (scanner.get(timeout=1) for _ in range(5))]
+    assert rss == [-50, -51, None, None, -52]
+    assert scanner.stale_count >= 2  # The repeats of -50; an empty scan is never stale
+
+def test_polling_adapts_to_stale_scans():
+    scanner = BackgroundScanner(interval=1.0, min_interval=0.1)
+    for _ in range(100):
+        scanner.adapt_interval(stale=False)
+    assert scanner.interval == 0.1
+    scanner.adapt_interval(stale=True)
+    assert abs(scanner.interval - 0.15) < 1e-12
+    for _ in range(100):
+        scanner.adapt_interval(stale=True)
+    assert scanner.interval == scanner.max_interval
+
+def test_scan_errors_reach_the_consumer():
+    results = [[{"ssid": "ap", "bssid": "a", "rss": -50}], [{"ssid": "ap", "bssid": "a", "rss": -51}]]
+    def failing_scan():
+        if results:
+            return results.pop(0)
+        raise FileNotFoundError("No Wi-Fi interface")
+    with BackgroundScanner(interval=0, drop_oldest=False, scan=failing_scan) as scanner:
+        rss = [scanner.get(timeout=1)[1][0]["rss"] for _ in range(2)]
+        with pytest.raises(FileNotFoundError):
+            scanner.get()
+        with pytest.raises(FileNotFoundError):
+            scanner.get_all()
+    assert rss == [-50, -51]
+    assert not scanner.thread.is_alive()
@@ -0,0 +1,44 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+import db
+import model
+import predict
+import filter as rss_filter
+from compact import compact_scans, pack_scan
+
+def test_pack_scan():
+    first_ssid_id, packed_rss = pack_scan([(3, -40), (5, -97.5)])
+    assert first_ssid_id == 3
+    assert [db.rss_at(packed_rss, i) for i in range(4)] == [-40, None, -97.5, None]
+    assert pack_scan([(3, -40), (3, -41)]) is None
+    assert pack_scan([(3, -40.3)]) is None
+    assert pack_scan([(3, -130)]) is None
+
+def test_packed_scans_read_like_rows(database, fetch_filtered, sort_networks):
+    rss_filter.filter_rss(incremental=False)
+    filtered = fetch_filtered(database)
+    scan_ids, scans = predict.get_scans_from_db()
+    fingerprints = sorted(predict.get_fingerprints_from_db(use_aggregation=False))
+
+    packed_count, skipped_count = compact_scans(chunk_scans=7)
+    assert (packed_count, skipped_count) == (len(scan_ids), 0)
+    assert db.get_connection().execute("SELECT COUNT(*) FROM wifi_signals").fetchone()[0] == 0
+
+    rss_filter.filter_rss(incremental=False)
+    assert fetch_filtered(database) == filtered
+    packed_scan_ids, packed_scans = predict.get_scans_from_db()
+    assert packed_scan_ids == scan_ids and list(map(sort_networks, packed_scans)) == list(map(sort_networks, scans))
+    assert sorted(predict.get_fingerprints_from_db(use_aggregation=False)) == fingerprints
+    assert compact_scans() == (0, 0)
+
+def test_packed_scans_in_sparse_storage(database, fetch_filtered):
+    rss_filter.filter_rss(incremental=False)
+    filtered = fetch_filtered(database)
+
+    model.make_wifi_signals_sparse()
+    compact_scans()
+    rss_filter.filter_rss(incremental=False)
+    assert fetch_filtered(database) == filtered
@@ -0,0 +1,37 @@
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+import db
+
+def test_get_connection_is_reused_per_thread(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DB_FILE_PATH", str(tmp_path / "test.db"))
+    conn = db.get_connection()
+    assert db.get_connection() is conn
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+    other = []
+    thread = threading.Thread(target=lambda: other.append(db.get_connection()))
+    thread.start()
+    thread.join()
+    assert other[0] is not conn
+
+    db.close_connections()
+    assert db.get_connection() is not conn
+    db.close_connections()
+
+def test_failed_write_is_rolled_back(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DB_FILE_PATH", str(tmp_path / "test.db"))
+    conn = db.get_connection()
+    with conn:
+        conn.execute("CREATE TABLE t (id INTEGER PRIMARY KEY)")
+    try:
+        with conn:
+            conn.execute("INSERT INTO t (id) VALUES (1)")
+            conn.execute("INSERT INTO t (id) VALUES (1)")
+    except db.sqlite3.IntegrityError:
+        pass
+    assert conn.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 0
+    db.close_connections()
@@ -0,0 +1,117 @@
+import os
+import sys
+import sqlite3
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+import db
+import model
+import filter as rss_filter
+import fingerprint
+from config import FilterType, FilterBackend, AggregationType
+
+def test_filter_rss_sparse_storage_matches_dense(database, fetch_filtered):
+    rss_filter.filter_rss()
+    dense = fetch_filtered(database)
+
+    assert model.make_wifi_signals_sparse() > 0
+    assert model.has_sparse_signals(db.get_connection())
+    rss_filter.filter_rss(incremental=False)
+    assert fetch_filtered(database) == dense
+
+def test_sparse_storage_skips_ssids_added_later(database, fetch_filtered):
+    conn = sqlite3.connect(database)
+    conn.execute("INSERT INTO ssids (ssid, bssid) VALUES ('new', '00:00:00:00:00:01')")
+    conn.commit()
+    conn.close()
+    rss_filter.filter_rss(incremental=False)
+    dense = fetch_filtered(database)
+
+    model.make_wifi_signals_sparse()
+    rss_filter.filter_rss(incremental=False)
+    assert fetch_filtered(database) == dense
+
+    # A sparse session stored after the SSID was added does read it as unreachable
+    location_id = dense[0][0]
+    session = [[[], f"2024-01-01 00:00:{i:02d}"] for i in range(5)]
+    fingerprint.store_session_to_db(location_id, session, "2024-01-01 00:00:00", store_unreachable=False)
+    rss_filter.filter_rss(incremental=False)
+    assert len(fetch_filtered(database)) == len(dense) + 1
+
+def test_incremental_filter_rss_recomputes_only_new_sessions(database, fetch_filtered):
+    conn = sqlite3.connect(database)
+    assert rss_filter.filter_rss() == len(fetch_filtered(database))
+    assert rss_filter.filter_rss() == 0
+
+    # A new session at one location dirties only the groups of that location
+    location_id, ssid_id = conn.execute("SELECT location_id, ssid_id FROM filtered_wifi_signals LIMIT 1").fetchone()
+    bssid = conn.execute("SELECT bssid FROM ssids WHERE id = ?", (ssid_id,)).fetchone()[0]
+    conn.close()
+    session = [[[{"ssid": "", "bssid": bssid, "rss": -30}], f"2024-01-01 00:00:{i:02d}"] for i in range(5)]
+    fingerprint.store_session_to_db(location_id, session, "2024-01-01 00:00:00")
+    before = fetch_filtered(database)
+    written = rss_filter.filter_rss()
+    assert written == sum(row[0] == location_id for row in before) < len(before)
+
+    incremental = fetch_filtered(database)
+    assert [row for row in incremental if row[0] != location_id] == [row for row in before if row[0] != location_id]
+    assert incremental != before
+
+    rss_filter.filter_rss(incremental=False)
+    assert fetch_filtered(database) == incremental
+
+def test_filter_rss_streams_in_small_chunks(database, fetch_filtered, monkeypatch):
+    rss_filter.filter_rss(incremental=False)
+    expected = fetch_filtered(database)
+
+    monkeypatch.setattr(rss_filter, "FILTER_FETCH_SIZE", 7)
+    monkeypatch.setattr(rss_filter, "FILTER_WRITE_BATCH_SIZE", 3)
+    assert rss_filter.filter_rss(incremental=False) == len(expected)
+    assert fetch_filtered(database) == expected
+
+def test_blocks_split_a_location_between_groups():
+    # One location with 50 SSIDs of 10 scans each is read in blocks bounded by the chunk, not by the location
+    rows = [(1, ssid_id, -50 - scan_id, scan_id) for ssid_id in range(50) for scan_id in range(10)]
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE signals (location_id, ssid_id, rss, scan_id)")
+    conn.executemany("INSERT INTO signals VALUES (?, ?, ?, ?)", rows)
+    cursor = conn.execute("SELECT * FROM signals ORDER BY location_id, ssid_id, scan_id")
+    blocks = list(rss_filter.iterate_blocks(cursor, 25))
+    assert len(blocks) > 1 and all(len(block) <= 25 + 10 for block in blocks)
+    assert all(block[-1, 1] != next_block[0, 1] for block, next_block in zip(blocks, blocks[1:]))
+    assert np.concatenate(blocks).tolist() == [list(map(float, row)) for row in rows]
+
+@pytest.mark.parametrize("filter_type", list(FilterType))
+@pytest.mark.parametrize("aggregation", list(AggregationType))
+def test_numpy_backend_matches_python_backend(database, fetch_filtered, monkeypatch, filter_type, aggregation):
+    monkeypatch.setattr(rss_filter, "FILTER", filter_type)
+    monkeypatch.setattr(rss_filter, "AGGREGATION", aggregation)
+    monkeypatch.setattr(rss_filter, "FILTER_FETCH_SIZE", 997)  # Blocks end inside groups
+
+    # A session of two scans is shorter than the moving-average window
+    conn = sqlite3.connect(database)
+    conn.execute("INSERT INTO scan_sessions (location_id, session_time) VALUES (1000, '')")
+    session_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+    for rss in (-60, -61):
+        conn.execute("INSERT INTO scans (session_id, scan_time) VALUES (?, '')", (session_id,))
+        conn.execute("INSERT INTO wifi_signals (scan_id, ssid_id, rss) VALUES (last_insert_rowid(), 1, ?)", (rss,))
+    conn.commit()
+    conn.close()
+
+    rss_filter.filter_rss(incremental=False, backend=FilterBackend.PYTHON)
+    expected = fetch_filtered(database)
+    rss_filter.filter_rss(incremental=False, backend=FilterBackend.NUMPY)
+    actual = fetch_filtered(database)
+
+    assert [row[:2] + row[3:4] for row in actual] == [row[:2] + row[3:4] for row in expected]
+    assert np.allclose([row[2] for row in actual], [row[2] for row in expected])
+    assert np.allclose([row[4] for row in actual], [row[4] for row in expected])
+
+def test_numpy_backend_process_pool(database, fetch_filtered, monkeypatch):
+    monkeypatch.setattr(rss_filter, "FILTER_FETCH_SIZE", 5000)
+    rss_filter.filter_rss(incremental=False, workers=1)
+    expected = fetch_filtered(database)
+    rss_filter.filter_rss(incremental=False, workers=2)
+    assert fetch_filtered(database) == expected
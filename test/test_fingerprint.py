@@ -0,0 +1,50 @@
+import os
+import sys
+import sqlite3
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+import db
+import model
+import fingerprint
+from config import RSS_FOR_UNREACHABLE
+
+def create_database(db_file_path, monkeypatch):
+    monkeypatch.setattr(db, "DB_FILE_PATH", str(db_file_path))
+    model.initialize_database()
+    conn = sqlite3.connect(db_file_path)
+    conn.execute("INSERT INTO locations (x, y, floor, location_name) VALUES (0, 0, 0, 'test')")
+    conn.executemany("INSERT INTO ssids (ssid, bssid) VALUES (?, ?)", [("a", "aa"), ("b", "bb"), ("c", "cc")])
+    conn.commit()
+    conn.close()
+
+def test_store_session_to_db(tmp_path, monkeypatch):
+    db_file_path = tmp_path / "test_wifi.db"
+    create_database(db_file_path, monkeypatch)
+    session = [
+        [[{"ssid": "a", "bssid": "aa", "rss": -40}, {"ssid": "x", "bssid": "xx", "rss": -50}], "2024-01-01 00:00:00"],
+        [[{"ssid": "c", "bssid": "cc", "rss": -60}, {"ssid": "b", "bssid": "bb", "rss": -70}], "2024-01-01 00:00:01"],
+    ]
+
+    fingerprint.store_session_to_db(1, session, "2024-01-01 00:00:00")
+
+    conn = sqlite3.connect(db_file_path)
+    assert conn.execute("SELECT id, session_id FROM scans").fetchall() == [(1, 1), (2, 1)]
+    assert conn.execute("SELECT scan_id, ssid_id, rss FROM wifi_signals ORDER BY id").fetchall() == [
+        (1, 1, -40), (1, 2, RSS_FOR_UNREACHABLE), (1, 3, RSS_FOR_UNREACHABLE),
+        (2, 3, -60), (2, 2, -70), (2, 1, RSS_FOR_UNREACHABLE),
+    ]
+    conn.close()
+
+def test_sparse_session_marks_the_database(tmp_path, monkeypatch):
+    db_file_path = tmp_path / "test_wifi.db"
+    create_database(db_file_path, monkeypatch)
+    session = [[[{"ssid": "a", "bssid": "aa", "rss": -40}], "2024-01-01 00:00:00"]]
+    assert not model.has_sparse_signals(db.get_connection())
+
+    fingerprint.store_session_to_db(1, session, "2024-01-01 00:00:00", store_unreachable=False)
+    conn = db.get_connection()
+    assert model.has_sparse_signals(conn)
+    assert conn.execute(f"SELECT ssid_id, rss FROM {model.get_wifi_signals_source(conn)} ORDER BY ssid_id").fetchall() == [
+        (1, -40), (2, RSS_FOR_UNREACHABLE), (3, RSS_FOR_UNREACHABLE),
+    ]
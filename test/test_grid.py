@@ -0,0 +1,36 @@
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from grid import build_virtual_grid, save_virtual_grid
+from predict import build_fingerprint_matrix, find_location, load_virtual_grid
+
+def test_virtual_grid_interpolates_between_locations(tmp_path):
+    structured_fingerprints = [
+        {"location_id": i, "x": float(x), "y": float(y), "floor": 0, "aa": -40 - 10 * x, "bb": -40 - 10 * y}
+        for i, (x, y) in enumerate([(0, 0), (2, 0), (0, 2), (2, 2)])
+    ]
+    grid_map = build_virtual_grid(build_fingerprint_matrix(structured_fingerprints), resolution=0.5, method="linear")
+    assert grid_map["rss"].shape == (25, 2)
+
+    save_virtual_grid(grid_map, tmp_path / "grid.npz")
+    loaded = load_virtual_grid(tmp_path / "grid.npz")
+    assert loaded["bssid_index"] == {"aa": 0, "bb": 1}
+    assert np.array_equal(loaded["rss"], grid_map["rss"])
+
+    # A scan from a point that was never surveyed matches the grid point there
+    x, y, floor = find_location(loaded, [{"ssid": "", "bssid": "aa", "rss": -55.4}, {"ssid": "", "bssid": "bb", "rss": -45.3}], k=1)
+    assert (x, y, floor) == (1.5, 0.5, 0)
+
+def test_virtual_grid_stays_in_the_surveyed_range():
+    rng = np.random.default_rng(0)
+    structured_fingerprints = [
+        {"location_id": i, "x": float(i % 5), "y": float(i // 5), "floor": 0, "aa": int(rng.choice([-100, -50])), "bb": -60}
+        for i in range(25)
+    ]
+    radio_map = build_fingerprint_matrix(structured_fingerprints)
+    grid_map = build_virtual_grid(radio_map, resolution=0.25, method="cubic")
+    assert grid_map["rss"][:, 0].min() >= -100 and grid_map["rss"][:, 0].max() <= -50
+    assert np.all(grid_map["rss"][:, 1] == -60)
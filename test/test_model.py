@@ -0,0 +1,83 @@
+import os
+import sys
+import sqlite3
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+import db
+import model
+
+def query_plan(conn, query, params=()):
+    return [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + query, params)]
+
+@pytest.fixture(params=["robotics_wifi.db", "myhome_wifi.db"])
+def migrated_database(request, copy_database):
+    db_file_path = copy_database(request.param)
+    model.initialize_database()
+    conn = sqlite3.connect(db_file_path)
+    yield conn
+    conn.close()
+
+def test_existing_databases_are_upgraded_in_place(migrated_database):
+    assert migrated_database.execute("PRAGMA user_version").fetchone()[0] == len(model.MIGRATIONS)
+    indexes = {row[0] for row in migrated_database.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert {"idx_wifi_signals_scan_ssid", "idx_scans_session", "idx_scan_sessions_location", "idx_filtered_wifi_signals_group"} <= indexes
+
+    # Running again is a no-op
+    assert model.migrate_database(migrated_database) == len(model.MIGRATIONS)
+
+def test_failed_migration_is_rolled_back(migrated_database, monkeypatch):
+    version = len(model.MIGRATIONS)
+    monkeypatch.setattr(model, "MIGRATIONS", model.MIGRATIONS + [["CREATE TABLE broken (id INTEGER)", "SELECT * FROM missing_table"]])
+    conn = db.get_connection()
+    with pytest.raises(sqlite3.OperationalError):
+        model.migrate_database(conn)
+    assert not conn.in_transaction
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == version
+    assert not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'broken'").fetchone()
+    with conn:
+        conn.execute("BEGIN")  # The next writer can start its transaction
+
+def test_location_queries_use_indexes(migrated_database):
+    plan = query_plan(migrated_database, """
+        SELECT s.ssid, s.bssid, w.rss, sc.scan_time
+        FROM wifi_signals w
+        JOIN scans sc ON w.scan_id = sc.id
+        JOIN ssids s ON w.ssid_id = s.id
+        JOIN scan_sessions ss ON sc.session_id = ss.id
+        WHERE ss.location_id = ?
+    """, (1,))
+    assert not any(step.startswith("SCAN") for step in plan)
+    assert any("idx_wifi_signals_scan_ssid" in step for step in plan)
+
+    plan = query_plan(migrated_database, """
+        SELECT l.id, s.bssid, f.agg_rss
+        FROM filtered_wifi_signals f
+        JOIN locations l ON f.location_id = l.id
+        JOIN ssids s ON f.ssid_id = s.id
+        WHERE l.id IN (?, ?)
+    """, (1, 2))
+    assert any("idx_filtered_wifi_signals_group" in step for step in plan)
+
+def test_sparse_signals_source_uses_index(migrated_database):
+    plan = query_plan(migrated_database, f"""
+        SELECT w.ssid_id, w.rss
+        FROM {model.wifi_signals_source(False)} w
+        JOIN scans sc ON w.scan_id = sc.id
+        JOIN scan_sessions ss ON sc.session_id = ss.id
+        WHERE ss.location_id = ?
+    """, (1,))
+    assert any("idx_wifi_signals_scan_ssid (scan_id=? AND ssid_id=?)" in step for step in plan)
+
+def test_packed_signals_source_uses_indexes(migrated_database):
+    migrated_database.create_function("rss_at", 2, lambda packed_rss, index: None)
+    plan = query_plan(migrated_database, f"""
+        SELECT w.ssid_id, w.rss
+        FROM {model.wifi_signals_source(True, packed=True)} w
+        JOIN scans sc ON w.scan_id = sc.id
+        JOIN scan_sessions ss ON sc.session_id = ss.id
+        WHERE ss.location_id = ?
+    """, (1,))
+    assert any("idx_scan_sessions_location" in step for step in plan)
+    assert any("SEARCH p USING INTEGER PRIMARY KEY" in step for step in plan)
@@ -0,0 +1,74 @@
+import os
+import sys
+import random
+from statistics import mean, median, variance
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+import network
+from config import AggregationType
+from network import NetworkAggregator
+
+def make_scans(scan_count, rng):
+    bssids = [f"00:00:00:00:{i:02x}" for i in range(20)]
+    return [[{"ssid": f"ap{bssid[-2:]}", "bssid": bssid, "rss": rng.randint(-95, -30)} for bssid in bssids if rng.random() < 0.7]
+            for _ in range(scan_count)]
+
+def samples_by_bssid(scans):
+    samples = {}
+    for networks in scans:
+        for network in networks:
+            samples.setdefault(network["bssid"], []).append(network["rss"])
+    return samples
+
+def test_aggregator_matches_statistics():
+    scans = make_scans(50, random.Random(0))
+    aggregator = NetworkAggregator(sample_size=64)
+    for networks in scans:
+        aggregator.add(networks)
+    samples = samples_by_bssid(scans)
+
+    mean_networks = aggregator.get_networks(AggregationType.MEAN)
+    assert [n["bssid"] for n in mean_networks] == list(samples)
+    for n in mean_networks:
+        assert n["count"] == len(samples[n["bssid"]])
+        assert abs(n["rss"] - mean(samples[n["bssid"]])) < 1e-9
+        assert abs(n["variance"] - variance(samples[n["bssid"]])) < 1e-9
+    for n in aggregator.get_networks(AggregationType.MEDIAN):
+        assert n["rss"] == median(samples[n["bssid"]])
+
+def test_aggregator_memory_is_bounded():
+    aggregator = NetworkAggregator(sample_size=16, seed=0)
+    for _ in range(1000):
+        aggregator.add([{"ssid": "ap", "bssid": "a", "rss": -60}, {"ssid": "ap", "bssid": "b", "rss": -70}])
+    assert all(len(stats["samples"]) == 16 for stats in aggregator.networks.values())
+    assert [(n["rss"], n["count"], n["variance"]) for n in aggregator.get_networks(AggregationType.MEDIAN)] == [(-60, 1000, 0), (-70, 1000, 0)]
+
+def test_networks_with_mean_and_median_rss(monkeypatch):
+    scans = iter(make_scans(10, random.Random(1)))
+    monkeypatch.setattr(network, "get_networks", lambda: next(scans))
+    networks = network.get_networks_with_mean_rss(scan_count=5, sleep_time=0)
+    assert all(set(n) == {"ssid", "bssid", "rss", "count", "variance"} for n in networks)
+    assert max(n["count"] for n in networks) <= 5
+    assert max(n["count"] for n in network.get_networks_with_median_rss(scan_count=5, sleep_time=0)) <= 5
+
+def test_aggregator_fills_in_missed_scans():
+    aggregator = NetworkAggregator(missing_rss=-95)
+    aggregator.add([{"ssid": "ap", "bssid": "a", "rss": -60}])
+    aggregator.add([{"ssid": "ap", "bssid": "b", "rss": -70}])
+    aggregator.add([])
+    networks = {n["bssid"]: n for n in aggregator.get_networks(AggregationType.MEAN)}
+    assert networks["a"]["count"] == networks["b"]["count"] == 3
+    assert abs(networks["a"]["rss"] - mean([-60, -95, -95])) < 1e-9
+    assert abs(networks["b"]["variance"] - variance([-95, -70, -95])) < 1e-9
+
+def test_unsettled_bssids():
+    rng = random.Random(2)
+    aggregator = NetworkAggregator()
+    for i in range(200):
+        aggregator.add([{"ssid": "", "bssid": "steady", "rss": -60 + rng.choice([-1, 0, 1])},
+                        {"ssid": "", "bssid": "noisy", "rss": -60 + rng.gauss(0, 20)}])
+        if i == 0:
+            assert aggregator.get_unsettled_bssids() == ["steady", "noisy"]
+    assert aggregator.get_unsettled_bssids(half_width=1.0, aggregation=AggregationType.MEAN) == ["noisy"]
+    assert aggregator.get_unsettled_bssids(half_width=5.0, aggregation=AggregationType.MEDIAN) == []
@@ -0,0 +1,211 @@
+import os
+import sys
+import sqlite3
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+import cluster
+import predict
+from config import FilterType, MatchingType
+from predict import RssFilterState, build_fingerprint_matrix, build_variance_matrices, build_clusters, build_index, find_location, predict_many, RSS_FOR_MISSING
+
+STRUCTURED_FINGERPRINTS = [
+    {"location_id": 1, "x": 0.0, "y": 0.0, "floor": 0, "aa": -40, "bb": -80},
+    {"location_id": 2, "x": 4.0, "y": 0.0, "floor": 0, "aa": -60, "bb": -60},
+    {"location_id": 3, "x": 4.0, "y": 4.0, "floor": 1, "aa": -80, "bb": -40, "cc": -50},
+]
+
+def test_build_fingerprint_matrix():
+    radio_map = build_fingerprint_matrix(STRUCTURED_FINGERPRINTS)
+    assert radio_map["bssid_index"] == {"aa": 0, "bb": 1, "cc": 2}
+    assert radio_map["rss"].shape == (3, 3)
+    assert radio_map["rss"][0, 2] == RSS_FOR_MISSING
+    assert list(radio_map["floor"]) == [0, 0, 1]
+
+def test_find_location_matches_weighted_knn():
+    radio_map = build_fingerprint_matrix(STRUCTURED_FINGERPRINTS)
+    scan = [{"ssid": "", "bssid": "aa", "rss": -42}, {"ssid": "", "bssid": "bb", "rss": -78}, {"ssid": "", "bssid": "zz", "rss": -70}]
+
+    x, y, floor = find_location(radio_map, scan, k=2)
+
+    d1 = np.sqrt(2 ** 2 + 2 ** 2 + 30 ** 2)
+    d2 = np.sqrt(18 ** 2 + 18 ** 2 + 30 ** 2)
+    assert np.isclose(x, (4.0 / d2) / (1 / d1 + 1 / d2))
+    assert np.isclose(y, 0.0)
+    assert floor == 0
+
+def test_find_location_without_networks():
+    radio_map = build_fingerprint_matrix(STRUCTURED_FINGERPRINTS)
+    assert find_location(radio_map, []) == (None, None, None)
+
+def test_find_location_breaks_ties_by_row_order():
+    # Six locations tie for the nearest; the first three rows are taken, as a stable sort would
+    distances = [2, 2, 1, 1, 1, 1, 1, 1, 3, 2]
+    fingerprints = [{"location_id": i, "x": float(i), "y": 0.0, "floor": 0, "aa": -50 - distance} for i, distance in enumerate(distances)]
+    radio_map = build_fingerprint_matrix(fingerprints)
+    scan = [{"ssid": "", "bssid": "aa", "rss": -50}]
+
+    assert find_location(radio_map, scan, k=3) == (3.0, 0.0, 0)
+    x, y, floor = predict_many(radio_map, [scan], k=3)
+    assert (x[0], y[0], floor[0]) == (3.0, 0.0, 0)
+
+def test_predict_many_matches_find_location():
+    radio_map = build_fingerprint_matrix(STRUCTURED_FINGERPRINTS)
+    scans = [
+        [{"ssid": "", "bssid": "aa", "rss": -42}, {"ssid": "", "bssid": "bb", "rss": -78}],
+        [{"ssid": "", "bssid": "cc", "rss": -55}, {"ssid": "", "bssid": "zz", "rss": -70}],
+        [{"ssid": "", "bssid": "aa", "rss": -61}, {"ssid": "", "bssid": "bb", "rss": -59}, {"ssid": "", "bssid": "cc", "rss": -90}],
+        [],
+    ]
+
+    x, y, floor = predict_many(radio_map, scans, k=2, batch_size=3)
+
+    for i, scan in enumerate(scans[:3]):
+        expected = find_location(radio_map, scan, k=2)
+        assert np.isclose(x[i], expected[0]) and np.isclose(y[i], expected[1]) and floor[i] == expected[2]
+    assert np.isnan(x[3]) and np.isnan(y[3]) and np.isnan(floor[3])
+
+def pad_scan(radio_map, scan):
+    """The scan with every BSSID of the map it did not hear at RSS_FOR_MISSING, which the default path then compares like the index."""
+    heard = {network["bssid"] for network in scan}
+    return scan + [{"ssid": "", "bssid": bssid, "rss": RSS_FOR_MISSING} for bssid in radio_map["bssid_index"] if bssid not in heard]
+
+def test_indexed_find_location_does_not_depend_on_trees(database):
+    structured_fingerprints = predict.structure_data(predict.get_fingerprints_from_db(use_aggregation=True))
+    tree_map = build_index(build_fingerprint_matrix(structured_fingerprints), min_locations=1)
+    brute_map = build_index(build_fingerprint_matrix(structured_fingerprints))
+    assert all(tree is not None for tree in tree_map["index"]["trees"])
+    assert all(tree is None for tree in brute_map["index"]["trees"])  # 24 locations, below INDEX_MIN_LOCATIONS
+
+    _, scans = predict.get_scans_from_db()
+    for scan in scans[::20]:
+        scan = [network for network in scan if network["rss"] > RSS_FOR_MISSING]  # Only what was heard
+        assert len(scan) < len(tree_map["bssid_index"])
+        tree_location = np.array(find_location(tree_map, scan), dtype=float)
+        assert np.allclose(tree_location, np.array(find_location(brute_map, scan), dtype=float), equal_nan=True)
+        if scan:
+            floor_map = build_fingerprint_matrix([f for f in structured_fingerprints if f["floor"] == tree_location[2]])
+            assert np.allclose(tree_location, np.array(find_location(floor_map, pad_scan(tree_map, scan)), dtype=float), equal_nan=True)
+
+def test_indexed_find_location_matches_brute_force_fallback():
+    rng = np.random.default_rng(0)
+    structured_fingerprints = []
+    for location_id in range(60):
+        row = {"location_id": location_id, "x": float(location_id % 6), "y": float(location_id // 6), "floor": location_id // 30}
+        row.update({f"b{i}": int(rss) for i, rss in enumerate(rng.integers(-95, -30, 8))})
+        structured_fingerprints.append(row)
+    tree_map = build_index(build_fingerprint_matrix(structured_fingerprints), min_locations=1)
+    brute_map = build_index(build_fingerprint_matrix(structured_fingerprints), min_locations=1000)
+    assert all(tree is not None for tree in tree_map["index"]["trees"])
+    assert all(tree is None for tree in brute_map["index"]["trees"])
+
+    # A noisy copy of a floor 1 fingerprint, with some BSSIDs not heard, should be matched on floor 1
+    scan = [{"ssid": "", "bssid": f"b{i}", "rss": structured_fingerprints[42][f"b{i}"] + 1} for i in range(5)]
+    scan.append({"ssid": "", "bssid": "unknown", "rss": -70})
+    tree_location = find_location(tree_map, scan, k=3)
+    brute_location = predict.find_location_indexed(brute_map, scan, k=3, floor=1)
+    default_location = find_location(build_fingerprint_matrix(structured_fingerprints[30:]), pad_scan(tree_map, scan), k=3)  # Floor 1 only
+    assert np.allclose(tree_location, brute_location)
+    assert np.allclose(tree_location, default_location)
+    assert tree_location[2] == 1
+
+def test_clustered_find_location_searches_nearest_clusters():
+    radio_map = build_fingerprint_matrix(STRUCTURED_FINGERPRINTS)
+    build_clusters(radio_map, {1: 0, 2: 1})
+    assert list(radio_map["clusters"]["unclustered_rows"]) == [2]
+
+    scan = [{"ssid": "", "bssid": "aa", "rss": -42}, {"ssid": "", "bssid": "bb", "rss": -78}]
+    x, y, floor = find_location(radio_map, scan, k=1)
+    assert (x, y, floor) == (0.0, 0.0, 0)
+
+def test_clustering_on_shipped_database(database):
+    radio_map = build_fingerprint_matrix(predict.structure_data(predict.get_fingerprints_from_db(use_aggregation=True)))
+    _, scans = predict.get_scans_from_db()
+    # Ties at the k-th nearest location are broken by row order, which clustering changes
+    scans = [scan for scan in scans[::25] if np.diff(np.sort(predict.calculate_distances(radio_map, scan))[2:4]).item() > 1e-9]
+    assert scans
+
+    # Before `cluster.py` has run every location is searched
+    assert "clusters" not in build_clusters(radio_map, predict.get_location_clusters_from_db())
+    brute_force = [find_location(radio_map, scan) for scan in scans]
+
+    cluster.cluster_locations(cluster_count=3)
+    build_clusters(radio_map, predict.get_location_clusters_from_db())
+    assert len(radio_map["clusters"]["rows"]) == 3
+    searched_all = [predict.find_location_clustered(radio_map, scan, clusters_to_search=3) for scan in scans]
+    assert np.allclose(np.array(searched_all, dtype=float), np.array(brute_force, dtype=float), equal_nan=True)
+
+def test_radio_map_reloader_swaps_in_changed_locations(database):
+    reloader = predict.RadioMapReloader()
+    old_radio_map = reloader.radio_map
+    assert not reloader.refresh()
+
+    conn = sqlite3.connect(database)
+    conn.execute("UPDATE filtered_wifi_signals SET agg_rss = agg_rss + 5 WHERE location_id = 3")
+    conn.execute("UPDATE locations SET x = 9 WHERE id = 7")
+    conn.commit()
+    conn.close()
+
+    assert reloader.refresh()
+    assert reloader.radio_map is not old_radio_map
+    expected = predict.init_prediction()
+    for location_id in expected["location_id"]:
+        row = np.flatnonzero(reloader.radio_map["location_id"] == location_id)[0]
+        expected_row = np.flatnonzero(expected["location_id"] == location_id)[0]
+        assert reloader.radio_map["x"][row] == expected["x"][expected_row]
+        assert np.array_equal(reloader.radio_map["rss"][row], expected["rss"][expected_row])
+
+def test_radio_map_reloader_picks_up_changed_variances(database, monkeypatch):
+    monkeypatch.setattr(predict, "MATCHING", MatchingType.GAUSSIAN)
+
+    reloader = predict.RadioMapReloader()
+    old_inverse_variance = reloader.radio_map["inverse_variance"].copy()
+    conn = sqlite3.connect(database)
+    conn.execute("UPDATE filtered_wifi_signals SET variance = variance + 50 WHERE location_id = 3")
+    conn.commit()
+    conn.close()
+
+    assert reloader.refresh()
+    row = np.flatnonzero(reloader.radio_map["location_id"] == 3)[0]
+    assert np.all(reloader.radio_map["inverse_variance"][row] < old_inverse_variance[row])
+
+def test_rss_filter_state_smooths_across_scans():
+    moving_average = RssFilterState(FilterType.MOVING_AVERAGE, window_size=3, max_missed_scans=1)
+    exponential = RssFilterState(FilterType.EXPONENTIAL, alpha=0.5)
+    for rss in (-60, -70, -80, -90):
+        averaged = moving_average.update([{"ssid": "", "bssid": "aa", "rss": rss}])
+        smoothed = exponential.update([{"ssid": "", "bssid": "aa", "rss": rss}])
+    assert averaged[0]["rss"] == -80
+    assert smoothed[0]["rss"] == -81.25
+
+    # "aa" is evicted after two scans without it and starts over
+    moving_average.update([{"ssid": "", "bssid": "bb", "rss": -50}])
+    moving_average.update([{"ssid": "", "bssid": "bb", "rss": -50}])
+    assert "aa" not in moving_average.slots
+    assert moving_average.update([{"ssid": "", "bssid": "aa", "rss": -40}])[0]["rss"] == -40
+
+def test_rss_filter_state_grows():
+    filter_state = RssFilterState(FilterType.EXPONENTIAL, capacity=2)
+    networks = [{"ssid": "", "bssid": f"b{i}", "rss": -40 - i} for i in range(5)]
+    assert [network["rss"] for network in filter_state.update(networks)] == [-40, -41, -42, -43, -44]
+
+def test_rss_filter_state_kalman_converges():
+    filter_state = RssFilterState(FilterType.KALMAN, process_noise=0.01, measurement_noise=9.0)
+    rng = np.random.default_rng(0)
+    for _ in range(200):
+        filtered = filter_state.update([{"ssid": "", "bssid": "aa", "rss": -70 + rng.normal(0, 3)}, {"ssid": "", "bssid": "bb", "rss": -50}])
+    assert abs(filtered[0]["rss"] + 70) < 1
+    assert filtered[1]["rss"] == -50
+
+def test_gaussian_find_location_uses_variances():
+    radio_map = build_fingerprint_matrix(STRUCTURED_FINGERPRINTS)
+    # Location 2 is noisy on "bb", so a scan between 1 and 2 on "bb" is more likely at 2
+    build_variance_matrices(radio_map, [(1, "aa", 4.0), (1, "bb", 4.0), (2, "aa", 4.0), (2, "bb", 400.0)], default_variance=25.0)
+    scan = [{"ssid": "", "bssid": "aa", "rss": -50}, {"ssid": "", "bssid": "bb", "rss": -72}]
+
+    x, y, floor = find_location(radio_map, scan)
+    assert floor == 0
+    assert 2.0 < x < 4.0 and y == 0.0
+
+    assert find_location(radio_map, [{"ssid": "", "bssid": "zz", "rss": -50}]) == (None, None, None)
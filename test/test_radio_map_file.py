@@ -0,0 +1,56 @@
+import os
+import sys
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+import predict
+from radio_map_file import save_radio_map_file, load_radio_map_file, MAGIC
+
+@pytest.fixture
+def radio_map_file(database, tmp_path):
+    radio_map = predict.build_radio_map_for_file()
+    filename = tmp_path / "radio_map.bin"
+    save_radio_map_file(radio_map, filename)
+    return radio_map, filename
+
+def test_radio_map_file_round_trip(radio_map_file, monkeypatch):
+    radio_map, filename = radio_map_file
+    loaded = load_radio_map_file(filename, verify=True)
+    assert isinstance(loaded["rss"], np.memmap)
+    assert loaded["bssid_index"] == radio_map["bssid_index"]
+    for name in ("rss", "location_id", "x", "y", "floor", "variance"):
+        assert np.allclose(loaded[name], radio_map[name], rtol=1e-6)  # RSS and variances are stored as float32
+
+    # Predictions from the mapped file match those from the database
+    monkeypatch.setattr(predict, "USE_RADIO_MAP_FILE", True)
+    monkeypatch.setattr(predict, "RADIO_MAP_FILE_PATH", str(filename))
+    monkeypatch.setattr(predict, "load_radio_map_file", lambda: load_radio_map_file(filename))
+    scan_ids, scans = predict.get_scans_from_db()
+    expected = predict.predict_many(predict.prepare_radio_map(radio_map), scans[:50])
+    actual = predict.predict_many(predict.init_prediction(), scans[:50])
+    for expected_values, actual_values in zip(expected, actual):
+        assert np.allclose(expected_values, actual_values, equal_nan=True)
+
+    # The reloader follows the file and leaves the database alone
+    monkeypatch.setattr(predict, "get_fingerprints_from_db", None)
+    reloader = predict.RadioMapReloader()
+    assert reloader.conn is None and not reloader.refresh()
+    os.utime(filename, (0, 0))
+    assert reloader.refresh()
+
+def test_radio_map_file_rejects_bad_files(radio_map_file):
+    radio_map, filename = radio_map_file
+    data = bytearray(filename.read_bytes())
+
+    data[-1] ^= 0xFF
+    filename.write_bytes(data)
+    load_radio_map_file(filename)
+    with pytest.raises(ValueError, match="corrupted"):
+        load_radio_map_file(filename, verify=True)
+
+    data[len(MAGIC)] += 1
+    filename.write_bytes(data)
+    with pytest.raises(ValueError, match="version"):
+        load_radio_map_file(filename)
@@ -0,0 +1,47 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+import network
+import predict
+from config import ScanBackend, FilterType
+from compact import compact_scans
+from replay import ScanReplayer, load_scans, load_scans_from_db, save_scan_log
+
+def test_replay_serves_the_stored_scans(database, sort_networks):
+    _, stored_scans = predict.get_scans_from_db()
+    scans = load_scans_from_db(database)
+    assert [networks for _, networks in scans] == stored_scans
+    assert all(a[0] <= b[0] for a, b in zip(scans, scans[1:]))
+
+    compact_scans()
+    assert [(timestamp, sort_networks(networks)) for timestamp, networks in load_scans_from_db(database)] == [
+        (timestamp, sort_networks(networks)) for timestamp, networks in scans
+    ]
+
+    replayer = ScanReplayer(scans, speed=0, loop=False)
+    assert [replayer.next_scan() for _ in scans] == stored_scans
+    assert replayer.done() and replayer.next_scan() == []
+
+def test_scan_log_round_trip(database, tmp_path):
+    scans = load_scans_from_db(database, session_id=1)
+    save_scan_log(tmp_path / "scans.jsonl", scans)
+    assert load_scans(str(tmp_path / "scans.jsonl")) == scans
+
+def test_replay_keeps_the_recorded_pace():
+    scans = [(0.0, [{"ssid": "", "bssid": "a", "rss": -50}]), (1.0, []), (1.5, []), (100.0, [])]
+    replayer = ScanReplayer(scans, speed=20, loop=True, max_gap=1.0)
+    start = time.monotonic()
+    for _ in range(5):
+        replayer.next_scan()
+    elapsed = time.monotonic() - start
+    assert 0.12 <= elapsed < 0.3  # Gaps of 1, 0.5 and 1 (capped) s at 20x, and none back to the start
+
+def test_get_networks_replays(database, monkeypatch):
+    monkeypatch.setattr(network, "SCAN_BACKEND", ScanBackend.REPLAY)
+    monkeypatch.setattr(network, "replayer", ScanReplayer(load_scans_from_db(database), speed=0))
+    radio_map = predict.build_radio_map(predict.structure_data(predict.get_fingerprints_from_db(use_aggregation=True)))
+    x, y, floor = predict.predict_location(radio_map, filter_type=FilterType.NONE, k=3, use_aggregation=True)
+    assert x is not None and y is not None
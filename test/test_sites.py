@@ -0,0 +1,56 @@
+import os
+import sys
+import shutil
+import sqlite3
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from config import Map
+from sites import SiteRegistry
+
+def copy_site_databases(tmp_path):
+    db_file_paths = {}
+    for site in (Map.HOME, Map.ROBOTICS):
+        db_file_paths[site] = str(tmp_path / f"{site.value}_wifi.db")
+        shutil.copy(os.path.join(os.path.dirname(__file__), '..', f"{site.value}_wifi.db"), db_file_paths[site])
+    db_file_paths[Map.CLASS] = str(tmp_path / "class_wifi.db")  # Not surveyed yet
+    return db_file_paths
+
+def get_scan(db_file_path):
+    conn = sqlite3.connect(db_file_path)
+    rows = conn.execute("""
+        SELECT s.ssid, s.bssid, w.rss
+        FROM wifi_signals w
+        JOIN ssids s ON w.ssid_id = s.id
+        WHERE w.scan_id = (SELECT MIN(id) FROM scans) AND w.rss > -95
+    """).fetchall()
+    conn.close()
+    return [{"ssid": ssid, "bssid": bssid, "rss": rss} for ssid, bssid, rss in rows]
+
+def test_site_registry_picks_the_site_of_a_scan(tmp_path):
+    db_file_paths = copy_site_databases(tmp_path)
+    registry = SiteRegistry(db_file_paths)
+    assert set(registry.reloaders) == {Map.HOME, Map.ROBOTICS}
+
+    for site in (Map.HOME, Map.ROBOTICS):
+        scan = get_scan(db_file_paths[site])
+        assert registry.find_site(scan) == site
+        found_site, x, y, floor = registry.find_location(scan)
+        assert found_site == site and x is not None
+
+    assert registry.find_location([{"ssid": "", "bssid": "unknown", "rss": -40}]) == (None, None, None, None)
+    assert not registry.refresh()
+
+def test_site_registry_queries_across_sites(tmp_path):
+    db_file_paths = copy_site_databases(tmp_path)
+    registry = SiteRegistry(db_file_paths)
+
+    summary = {row[0]: row[1:] for row in registry.get_site_summary()}
+    assert set(summary) == {Map.HOME.value, Map.ROBOTICS.value}
+    conn = sqlite3.connect(db_file_paths[Map.ROBOTICS])
+    assert summary[Map.ROBOTICS.value][0] == conn.execute("SELECT COUNT(*) FROM locations").fetchone()[0]
+    conn.close()
+
+    for bssid, sites in registry.get_shared_bssids():
+        assert sorted(sites.split(",")) == [Map.HOME.value, Map.ROBOTICS.value]
+        assert len(registry.bssid_sites.get(bssid, ())) <= 2
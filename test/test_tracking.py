@@ -0,0 +1,65 @@
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from predict import build_fingerprint_matrix
+from tracking import ParticleFilterTracker, PositionKalmanTracker
+
+def test_position_kalman_tracker_follows_constant_velocity():
+    rng = np.random.default_rng(0)
+    tracker = PositionKalmanTracker(process_noise=0.1, measurement_noise=1.0)
+    raw_errors = []
+    tracked_errors = []
+    for t in range(60):
+        true_x, true_y = 0.5 * t, 2.0
+        x, y = true_x + rng.normal(0, 1.0), true_y + rng.normal(0, 1.0)
+        tracked_x, tracked_y, floor = tracker.update(x, y, 0, timestamp=float(t))
+        if t >= 20:
+            raw_errors.append(np.hypot(x - true_x, y - true_y))
+            tracked_errors.append(np.hypot(tracked_x - true_x, tracked_y - true_y))
+    assert floor == 0
+    assert np.mean(tracked_errors) < 0.7 * np.mean(raw_errors)
+
+def test_position_kalman_tracker_restarts_on_floor_change():
+    tracker = PositionKalmanTracker()
+    tracker.update(1.0, 1.0, 0, timestamp=0.0)
+    assert tracker.update(None, None, None, timestamp=1.0) == (1.0, 1.0, 0)
+    assert tracker.update(5.0, 5.0, 1, timestamp=2.0) == (5.0, 5.0, 1)
+
+def make_path_loss_map(rng):
+    access_points = rng.uniform(0, 20, (12, 2))
+    grid = [(x, y) for x in range(21) for y in range(21)]
+    structured_fingerprints = []
+    for location_id, (x, y) in enumerate(grid):
+        distances = np.hypot(access_points[:, 0] - x, access_points[:, 1] - y) + 1
+        row = {"location_id": location_id, "x": float(x), "y": float(y), "floor": 0}
+        row.update({f"b{i}": -30 - 20 * np.log10(d) for i, d in enumerate(distances)})
+        structured_fingerprints.append(row)
+    return access_points, build_fingerprint_matrix(structured_fingerprints)
+
+def test_particle_filter_tracker_follows_moving_device():
+    rng = np.random.default_rng(0)
+    access_points, radio_map = make_path_loss_map(rng)
+    tracker = ParticleFilterTracker(particle_count=2000, motion_std=1.0, rss_std=4.0, seed=0)
+    errors = []
+    for t in range(30):
+        true_x, true_y = 2 + 0.5 * t, 10.0
+        distances = np.hypot(access_points[:, 0] - true_x, access_points[:, 1] - true_y) + 1
+        scan = [{"ssid": "", "bssid": f"b{i}", "rss": -30 - 20 * np.log10(d) + rng.normal(0, 2)} for i, d in enumerate(distances)]
+        x, y, floor = tracker.update(radio_map, scan, timestamp=float(t))
+        if t >= 5:
+            errors.append(np.hypot(x - true_x, y - true_y))
+    assert floor == 0
+    assert np.mean(errors) < 1.5
+
+def test_particle_filter_tracker_counts_the_first_scan_once():
+    rng = np.random.default_rng(1)
+    access_points, radio_map = make_path_loss_map(rng)
+    tracker = ParticleFilterTracker(particle_count=500, rss_std=4.0, seed=0)
+    distances = np.hypot(access_points[:, 0] - 5, access_points[:, 1] - 5) + 1
+    scan = [{"ssid": "", "bssid": f"b{i}", "rss": -30 - 20 * np.log10(d)} for i, d in enumerate(distances)]
+    x, y, floor = tracker.update(radio_map, scan, timestamp=0.0)
+    assert np.allclose(tracker.weights, 1 / 500)  # Drawn from the likelihood, not weighted by it again
+    assert np.allclose((x, y), tracker.particles.mean(axis=0))